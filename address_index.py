@@ -0,0 +1,138 @@
+from datetime import date
+import json
+import os
+import re
+import threading
+
+from reference_data import normalise
+
+
+def address_key(postal_code: str, address_line_1: str) -> str:
+    # 'SW1Y 4QU' + '3rd Floor, 13 Charles II Street' -> 'SW1Y4QU|3rd floor 13 charles ii street'
+    if not postal_code or not address_line_1:
+        return None
+    return re.sub(r'\s+', '', postal_code).upper() + "|" + normalise(address_line_1)
+
+
+def lifetime_years(date_of_creation: str, date_of_cessation: str) -> float:
+    # years between incorporation and dissolution (None if still active or unknown)
+    try:
+        return (date.fromisoformat(date_of_cessation) - date.fromisoformat(date_of_creation)).days / 365.25
+    except (TypeError, ValueError) as e:
+        return None
+
+
+class AddressIndex:
+    # Every company seen, grouped by normalised registered office address, with per-address
+    # counters (companies, dissolved, short-lived, high-risk) kept up to date as companies are
+    # added or re-analysed, so the proportions used to spot registration farms are O(1) lookups.
+    # Persisted as an append-only JSON-lines file (latest record per company wins), loaded once
+    # and compacted when mostly superseded (on first use).
+    def __init__(self, path: str, short_lived_years: float = 2.0, high_risk_score: float = 60.0):
+        self.path = path
+        self.short_lived_years = short_lived_years  # dissolved within this many years of incorporation
+        self.high_risk_score = high_risk_score  # final score from which a company counts as high-risk
+        self.records = {}  # company number -> latest record
+        self.counters = {}  # address key -> {'companies': n, 'dissolved': n, 'short_lived': n, 'high_risk': n}
+        self.lock = threading.Lock()
+        self.loaded = False
+
+    def load(self) -> None:
+        # reads the file (caller holds the lock)
+        if self.loaded:
+            return
+        self.loaded = True
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        line_count = 0
+        if os.path.exists(self.path):
+            with open(self.path) as fp:
+                for line in fp:
+                    line_count += 1
+                    try:
+                        record = json.loads(line)
+                    except ValueError as e:
+                        # last line can be truncated after a crash
+                        continue
+                    self.update(record)
+        if line_count > 2 * len(self.records) + 100:
+            self.compact()
+
+    def contributions(self, record: dict) -> dict:
+        lifetime = lifetime_years(record['date_of_creation'], record['date_of_cessation'])
+        return {
+            'companies': 1,
+            'dissolved': int(record['company_status'] == 'dissolved'),
+            'short_lived': int(lifetime is not None and lifetime < self.short_lived_years),
+            'high_risk': int(record['score'] is not None and record['score'] >= self.high_risk_score),
+        }
+
+    def update(self, record: dict) -> None:
+        # replaces the previous record of the company in the counters (caller holds the lock)
+        previous = self.records.get(record['company_number'])
+        if previous is not None:
+            counters = self.counters[previous['address']]
+            for name, value in self.contributions(previous).items():
+                counters[name] -= value
+            if not counters['companies']:
+                del self.counters[previous['address']]
+        counters = self.counters.setdefault(record['address'], dict.fromkeys(('companies', 'dissolved', 'short_lived', 'high_risk'), 0))
+        for name, value in self.contributions(record).items():
+            counters[name] += value
+        self.records[record['company_number']] = record
+
+    def add(self, company) -> None:
+        # records (or refreshes) a company under its registered office address
+        office = company.registered_office
+        key = address_key(office.postal_code, office.address_line_1) if office else None
+        if not key:
+            return
+        record = {
+            'company_number': company.company_number,
+            'address': key,
+            'company_status': company.company_status,
+            'date_of_creation': company.date_of_creation,
+            'date_of_cessation': company.date_of_cessation,
+            'score': company.summary_score.get('final_company_score'),
+        }
+        with self.lock:
+            self.load()
+            previous = self.records.get(company.company_number)
+            if previous is not None and record['score'] is None:
+                # keep the last known score until the company is scored again
+                record['score'] = previous['score']
+            if record == previous:
+                return
+            self.update(record)
+            with open(self.path, 'a') as fp:
+                fp.write(json.dumps(record) + "\n")
+
+    def counts(self, postal_code: str, address_line_1: str) -> dict:
+        with self.lock:
+            self.load()
+            return dict(self.counters.get(address_key(postal_code, address_line_1), {}))
+
+    def proportion(self, postal_code: str, address_line_1: str, counter: str, min_companies: int = 1) -> float:
+        # share of the companies registered at the address with the counter set (0.0 under min_companies)
+        with self.lock:
+            self.load()
+            counters = self.counters.get(address_key(postal_code, address_line_1))
+            if not counters or counters['companies'] < min_companies:
+                return 0.0
+            return counters[counter] / counters['companies']
+
+    def compact(self) -> None:
+        # rewrite the file with the latest record of each company only
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as fp:
+            for record in self.records.values():
+                fp.write(json.dumps(record) + "\n")
+        os.replace(temp_path, self.path)
+
+    def stats(self) -> dict:
+        with self.lock:
+            self.load()
+            return {
+                'companies': len(self.records),
+                'addresses': len(self.counters),
+                'largest': max((counters['companies'] for counters in self.counters.values()), default=0),
+            }
@@ -0,0 +1,108 @@
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rate_limiter import RateLimiter, retry_after_seconds
+
+
+class ApiSession:
+    # Single pooled HTTP session shared by all Companies House API calls:
+    # authentication is set up once and TCP/TLS connections are kept alive and reused
+    def __init__(self, access_token: str, pool_size: int = 10, timeout: float = 30.0, connect_timeout: float = 10.0,
+                 rate_limiter: RateLimiter = None, max_retries: int = 5):
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, timeout)  # (connect, read) in seconds
+        # Optional limiter shared by every caller in the process, acquired before each request
+        self.rate_limiter = rate_limiter
+        # Number of times a request is retried after a 429 (Too Many Requests)
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        self.session.auth = requests.auth.HTTPBasicAuth(access_token, '')
+        self.session.headers['Connection'] = 'keep-alive'
+        # pool_block caps the number of open connections per host to pool_size (extra threads wait)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.adapter = adapter
+        # Stats
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.rate_limited_count = 0
+        self.downloaded_bytes = 0
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        # per-request timeout can be overridden with timeout=...
+        kwargs.setdefault('timeout', self.timeout)
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            response = self.session.get(url, **kwargs)
+            with self.lock:
+                # redirects (e.g. document content to S3) are separate requests on the wire
+                self.request_count += 1 + len(response.history)
+            if response.status_code != 429 or attempt == self.max_retries:
+                return response
+            # over quota: hold back every caller sharing the limiter, then retry
+            with self.lock:
+                self.rate_limited_count += 1
+            wait = retry_after_seconds(response.headers, default=2.0 ** attempt)
+            response.close()
+            if self.rate_limiter:
+                self.rate_limiter.pause(wait)
+            else:
+                time.sleep(wait)
+        return response
+
+    def download(self, url: str, file_path: str, chunk_size: int = 64 * 1024, **kwargs) -> int:
+        # streams the response body to file_path in chunks (never holding the whole file in memory)
+        # the file is written to a temporary name and renamed once complete, so a partial
+        # download never looks like a finished one
+        response = self.get(url, stream=True, **kwargs)
+        temp_path = file_path + '.part'
+        size = 0
+        try:
+            response.raise_for_status()
+            with open(temp_path, 'wb') as binary_file:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    binary_file.write(chunk)
+                    size += len(chunk)
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        finally:
+            response.close()
+        with self.lock:
+            self.downloaded_bytes += size
+        return size
+
+    def connection_count(self) -> int:
+        # number of TCP connections opened so far across all host pools
+        pools = self.adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in list(pools.keys()))
+
+    def stats(self) -> dict:
+        with self.lock:
+            request_count = self.request_count
+        connection_count = self.connection_count()
+        return {
+            'requests': request_count,
+            'rate_limited': self.rate_limited_count,
+            'downloaded_bytes': self.downloaded_bytes,
+            'connections': connection_count,
+            'reused_connections': max(request_count - connection_count, 0),
+            'reuse_ratio': (1 - connection_count / request_count) if request_count else 0.0,
+            'pool_size': self.pool_size,
+        }
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __str__(self) -> str:
+        stats = self.stats()
+        return "%d requests over %d connections (%d reused)" % (
+            stats['requests'], stats['connections'], stats['reused_connections'])
@@ -0,0 +1,132 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+
+
+def is_dormant(profile: dict) -> bool:
+    # last accounts filed as dormant, or the 'dormant company' SIC code
+    try:
+        if profile['accounts']['last_accounts']['type'] == 'dormant':
+            return True
+    except (KeyError, TypeError) as e:
+        pass
+    return '99999' in (profile.get('sic_codes') or [])
+
+
+class AppointmentsGraph:
+    # Network of officers and the companies they are appointed to, crawled breadth-first from the
+    # officers of the companies analysed:
+    # depth 1 = appointments of the officers, 2 = profile and officers of those companies,
+    # 3 = appointments of those officers, ...
+    # Every node is fetched at most once per process and shared by all analyses (a node being fetched
+    # by another crawl is waited for rather than requested again), each level is fetched concurrently
+    # and each crawl stops once its budget of new nodes is spent, so overlapping networks stay cheap
+    def __init__(self, workers: int = 8):
+        self.workers = workers
+        self.nodes = {}  # ('officer', officer ID) or ('company', company number) -> Future of the node data
+        self.lock = threading.Lock()
+        # Stats
+        self.fetched = 0
+        self.reused = 0
+        self.failed = 0
+        self.truncated = 0  # crawls stopped by their node budget
+
+    def crawl(self, officer_ids: list, fetch_appointments, fetch_company, max_depth: int = 1,
+              max_nodes: int = 100, company_number: str = None) -> int:
+        # fetch_appointments(officer ID) -> list of appointments (dicts with a 'company_number')
+        # fetch_company(company number) -> {'profile': dict, 'officers': [officer IDs]}
+        # company_number: company the officers come from (already analysed, so not fetched again)
+        # returns the number of nodes fetched by this crawl
+        fetchers = {'officer': fetch_appointments, 'company': fetch_company}
+        level = [('officer', officer_id) for officer_id in dict.fromkeys(officer_ids) if officer_id]
+        seen = set(level)
+        seen.add(('company', company_number))
+        fetched = 0
+        truncated = False
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for depth in range(1, max_depth + 1):
+                if not level:
+                    break
+                futures = []
+                with self.lock:
+                    for node in level:
+                        future = self.nodes.get(node)
+                        if future is not None:
+                            self.reused += 1
+                        elif fetched < max_nodes:
+                            future = self.nodes[node] = executor.submit(self.fetch, node, fetchers[node[0]])
+                            fetched += 1
+                        else:
+                            # budget spent: only nodes already known are still expanded
+                            truncated = True
+                            continue
+                        futures.append((node, future))
+
+                # next level: neighbours not reached yet by this crawl
+                level = []
+                for node, future in futures:
+                    for neighbour in self.neighbours(node, future.result()):
+                        if neighbour not in seen:
+                            seen.add(neighbour)
+                            level.append(neighbour)
+        if truncated:
+            with self.lock:
+                self.truncated += 1
+        return fetched
+
+    def fetch(self, node: tuple, fetcher):
+        try:
+            data = fetcher(node[1])
+        except Exception as e:
+            print("Appointments graph: '%s' could not be fetched: %r" % (node[1], e))
+            data = None
+        with self.lock:
+            if data is None:
+                # forget the node so a later crawl can try again
+                self.nodes.pop(node, None)
+                self.failed += 1
+            else:
+                self.fetched += 1
+        return data
+
+    @staticmethod
+    def neighbours(node: tuple, data) -> list:
+        if data is None:
+            return []
+        if node[0] == 'officer':
+            return [('company', appointment['company_number']) for appointment in data if appointment.get('company_number')]
+        return [('officer', officer_id) for officer_id in data['officers']]
+
+    def add(self, node: tuple, data) -> bool:
+        # node data known from elsewhere (e.g. the company store), unless the node is already fetched or being fetched
+        if data is None:
+            return False
+        with self.lock:
+            if node in self.nodes:
+                return False
+            future = self.nodes[node] = Future()
+            future.set_result(data)
+        return True
+
+    def get(self, node: tuple):
+        # data of a node that has been fetched, or None
+        with self.lock:
+            future = self.nodes.get(node)
+        if future is None or not future.done():
+            return None
+        return future.result()
+
+    def appointments(self, officer_id: str) -> list:
+        return self.get(('officer', officer_id))
+
+    def company(self, company_number: str) -> dict:
+        return self.get(('company', company_number))
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'nodes': len(self.nodes),
+                'fetched': self.fetched,
+                'reused': self.reused,
+                'failed': self.failed,
+                'truncated': self.truncated,
+            }
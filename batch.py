@@ -0,0 +1,186 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+import os
+import sys
+import time
+
+from batch_scoring import score_companies
+from export import PortfolioExport
+from model import Company, Analysis
+
+
+def read_company_numbers(source) -> list:
+    # one company number per line, blank lines and comments (#) ignored, duplicates dropped
+    company_numbers = []
+    seen = set()
+    for line in source:
+        company_number = line.split('#')[0].strip().upper()
+        if not company_number:
+            continue
+        if company_number.isdigit():
+            # spreadsheets tend to strip the leading zeros of Companies House numbers
+            company_number = company_number.zfill(8)
+        if company_number not in seen:
+            seen.add(company_number)
+            company_numbers.append(company_number)
+    return company_numbers
+
+
+def load_checkpoint(checkpoint_path: str) -> set:
+    # company numbers already analysed successfully by a previous (possibly crashed) run
+    done = set()
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as fp:
+            for line in fp:
+                try:
+                    entry = json.loads(line)
+                except ValueError as e:
+                    # last line can be truncated after a crash
+                    continue
+                if entry.get('status') == 'done':
+                    done.add(entry['company_number'])
+    return done
+
+
+def analyse(company_number: str, download_binary: bool = False, from_store: bool = False,
+            export: PortfolioExport = None, incremental: bool = False) -> dict:
+    analysis = fetch(company_number, download_binary=download_binary, from_store=from_store, incremental=incremental)
+    analysis.score()
+    if export:
+        export.add(analysis.company)
+    return analysis.company.summary_score
+
+
+def fetch(company_number: str, download_binary: bool = False, from_store: bool = False,
+          incremental: bool = False) -> Analysis:
+    # data only, scoring is left to batch_scoring.score_companies
+    # from_store re-scores a company analysed before, from the company store only (no API calls)
+    # incremental only fetches what changed since the last analysis in the company store (see Analysis.get_api_data)
+    analysis = Analysis(Company(company_number=company_number))
+    if from_store:
+        if not analysis.load_stored_data():
+            raise LookupError("'%s' is not in the company store" % company_number)
+    else:
+        analysis.get_api_data(download_binary=download_binary, incremental=incremental)
+    return analysis
+
+
+def score_fetched(analyses: list, export: PortfolioExport = None) -> dict:
+    # vectorized scoring of all the companies fetched: company number -> summary score
+    score_companies([analysis.company for analysis in analyses],
+                    reuse=frozenset().union(*(analysis.reused for analysis in analyses)))
+    for analysis in analyses:
+        analysis.index_address()
+        analysis.rank()
+        analysis.save_scores()
+        if export:
+            export.add(analysis.company)
+    return {analysis.company.company_number: analysis.company.summary_score for analysis in analyses}
+
+
+def run_batch(company_numbers: list, download_binary: bool = False, workers: int = 4,
+              checkpoint_path: str = 'output/batch_checkpoint.jsonl', vectorized: bool = False,
+              from_store: bool = False, export: PortfolioExport = None, incremental: bool = False) -> dict:
+    # Threads rather than processes: analyses are I/O bound and threads share the
+    # process-wide HTTP session, response cache and rate limiter (so the API quota holds)
+    # With vectorized, companies are only fetched concurrently, then all their officers and PSCs
+    # are scored in one columnar pass (checkpoints are written once everything is scored)
+    # With from_store, companies are re-scored from the company store instead of the API
+    # With incremental, only what changed since the last analysis is fetched and scored
+    # With export, the companies analysed are appended to the columnar export (see export.py)
+    done = load_checkpoint(checkpoint_path)
+    todo = [company_number for company_number in company_numbers if company_number not in done]
+    print("Batch: %d companies, %d already done, %d to analyse" % (len(company_numbers), len(company_numbers) - len(todo), len(todo)))
+
+    os.makedirs(os.path.dirname(checkpoint_path) or '.', exist_ok=True)
+    succeeded = 0
+    failed = 0
+    start = time.perf_counter()
+    with open(checkpoint_path, 'a') as checkpoint, ThreadPoolExecutor(max_workers=workers) as executor:
+        def write_checkpoint(entry: dict) -> None:
+            # checkpoint is flushed after every company so a crash loses at most the ones in flight
+            checkpoint.write(json.dumps(entry) + "\n")
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+
+        if vectorized:
+            futures = {executor.submit(fetch, company_number, download_binary, from_store, incremental): company_number
+                       for company_number in todo}
+        else:
+            futures = {executor.submit(analyse, company_number, download_binary, from_store, export, incremental): company_number
+                       for company_number in todo}
+        analyses = []
+        for future in as_completed(futures):
+            company_number = futures[future]
+            try:
+                result = future.result()
+                if vectorized:
+                    analyses.append(result)
+                    continue
+                entry = {'company_number': company_number, 'status': 'done', 'summary_score': result}
+                succeeded += 1
+            except Exception as e:
+                entry = {'company_number': company_number, 'status': 'failed', 'error': repr(e)}
+                failed += 1
+                print("Analysis of '%s' failed: %r" % (company_number, e))
+            write_checkpoint(entry)
+
+        if analyses:
+            for company_number, summary_score in score_fetched(analyses, export).items():
+                write_checkpoint({'company_number': company_number, 'status': 'done', 'summary_score': summary_score})
+                succeeded += 1
+
+        if export:
+            # last (partial) batch of the export
+            export.flush()
+
+    elapsed = time.perf_counter() - start
+    throughput = (succeeded + failed) / elapsed * 60 if elapsed > 0 else 0.0
+    results = {
+        'companies': len(company_numbers),
+        'skipped': len(company_numbers) - len(todo),
+        'succeeded': succeeded,
+        'failed': failed,
+        'elapsed_seconds': round(elapsed, 2),
+        'companies_per_minute': round(throughput, 2),
+    }
+    print("Batch done: %d succeeded, %d failed, %d skipped in %.1fs (%.2f companies/minute)" % (
+        succeeded, failed, results['skipped'], elapsed, throughput))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Analyse many companies (one company number per line)")
+    parser.add_argument('source', help="file with company numbers, or - to read from stdin")
+    parser.add_argument('flag', nargs='?', default='basic', choices=['basic', 'binary'])
+    parser.add_argument('--workers', type=int, default=4, help="number of companies analysed concurrently")
+    parser.add_argument('--checkpoint', help="progress file used to resume (default: output/batch_checkpoint.jsonl, "
+                                             "output/rescore_checkpoint.jsonl with --from-store, "
+                                             "output/incremental_checkpoint-<date>.jsonl with --incremental)")
+    parser.add_argument('--vectorized', action='store_true', help="score all the companies in one columnar pass (NumPy)")
+    parser.add_argument('--from-store', action='store_true', help="re-score companies from the company store (no API calls)")
+    parser.add_argument('--incremental', action='store_true', help="only fetch and score what changed since the last analysis "
+                                                                   "in the company store")
+    parser.add_argument('--export', metavar='DIRECTORY', help="append the companies analysed to a columnar export (Parquet, or gzipped CSV)")
+    parser.add_argument('--export-format', choices=['parquet', 'csv'], help="default: parquet if pyarrow is installed, else csv")
+    args = parser.parse_args()
+
+    if args.source == '-':
+        numbers = read_company_numbers(sys.stdin)
+    else:
+        with open(args.source) as fp:
+            numbers = read_company_numbers(fp)
+
+    if args.from_store and args.incremental:
+        parser.error("--from-store and --incremental are exclusive")
+    if args.checkpoint:
+        checkpoint_path = args.checkpoint
+    elif args.incremental:
+        # one checkpoint per day: incremental runs are meant to be repeated over the same companies
+        checkpoint_path = 'output/incremental_checkpoint-%s.jsonl' % time.strftime('%Y%m%d')
+    else:
+        checkpoint_path = 'output/rescore_checkpoint.jsonl' if args.from_store else 'output/batch_checkpoint.jsonl'
+    export = PortfolioExport(args.export, file_format=args.export_format) if args.export else None
+    run_batch(numbers, download_binary=args.flag == 'binary', workers=args.workers, checkpoint_path=checkpoint_path,
+              vectorized=args.vectorized, from_store=args.from_store, export=export, incremental=args.incremental)
@@ -0,0 +1,147 @@
+from datetime import date
+
+import numpy as np
+
+import model
+
+
+def scored_persons(company) -> tuple:
+    # (individuals, legal entities) scored by the per-object path, officers and PSCs alike
+    individuals = []
+    entities = []
+    for officer in company.officers:
+        if officer.officer_role in ("director", "secretary"):
+            individuals.append(officer)
+        elif officer.officer_role in ("corporate-secretary", "corporate-director"):
+            entities.append(officer)
+    for psc in company.pscs:
+        if psc.is_corporate():
+            entities.append(psc)
+        else:
+            individuals.append(psc)
+    return individuals, entities
+
+
+def country_flags(values: list) -> np.ndarray:
+    # red flag country lookups, once per distinct value
+    matches = {value: model.red_flag_countries_index.match_any(value) is not None for value in set(values)}
+    return np.array([matches[value] for value in values], dtype=bool)
+
+
+def score_persons(persons: list, extra_search_terms: list) -> np.ndarray:
+    # Columnar equivalent of Person.score: fields of all persons are pulled into arrays, every
+    # flag is computed in one pass, then scores and red flags are written back to each person
+    disqualified = np.array([person.is_disqualified_director() for person in persons], dtype=bool)
+    for person, is_disqualified in zip(persons, disqualified):
+        if not is_disqualified and person.name:
+            person.name_preprocessing()
+
+    names = [person.name for person in persons]
+    fake_names = model.fake_names_matcher.match_many(names)
+    name_flags = np.array([name in fake_names for name in names], dtype=bool)
+
+    queries = [person.news_query(extra_search_term) for person, extra_search_term in zip(persons, extra_search_terms)]
+    model.prefetch_news([query for query in queries if query])
+    news = {query: len(model.lookup_news(query)) > 0 for query in set(queries) if query}
+    news_flags = np.array([news.get(query, False) for query in queries], dtype=bool)
+
+    nationality_flags = country_flags([person.nationality for person in persons])
+    residence_flags = country_flags([person.country_of_residence for person in persons])
+
+    dob_years = np.array([person.dob_year or 0 for person in persons], dtype=np.int64)
+    ages = date.today().year - dob_years
+    below_min_age = (dob_years != 0) & (ages < model.min_age)
+    above_max_age = (dob_years != 0) & (ages > model.max_age)
+
+    # flags in the order of Person.score, with the red flags each one raises
+    flags = ['name_flag', 'news_mentions_flag', 'nationality_flag', 'residence_flag', 'age_flag']
+    raised = np.column_stack([name_flags, news_flags, nationality_flags, residence_flags, below_min_age | above_max_age])
+    red_flags = [[[model.red_flag_messages[flag]] if raised[i, column] else [] for column, flag in enumerate(flags[:-1])]
+                 for i in range(len(persons))]
+    for i in range(len(persons)):
+        if below_min_age[i]:
+            red_flags[i].append([model.red_flag_messages['below_min_age']])
+        elif above_max_age[i]:
+            red_flags[i].append([model.red_flag_messages['above_max_age']])
+        else:
+            red_flags[i].append([])
+
+    # results already memoized for an individual (see person_registry) take precedence, as in Person.memoized_flag:
+    # each individual is resolved once and all their components are looked up (and memoized) in one call
+    registry = model.person_registry
+    if registry:
+        components = [registry.component(flag) for flag in flags]
+        news_column = flags.index('news_mentions_flag')
+        rows = raised.tolist()  # plain lists: numpy element access is slow one cell at a time
+        for i, person in enumerate(persons):
+            if disqualified[i]:
+                continue
+            key = registry.resolve(person)
+            components[news_column] = registry.component('news_mentions_flag', extra_search_terms[i])
+            cached = registry.get_many(key, components)
+            missing = {}
+            for column, entry in enumerate(cached):
+                if entry is None:
+                    missing[components[column]] = (rows[i][column], red_flags[i][column])
+                else:
+                    rows[i][column], red_flags[i][column] = entry
+            if missing:
+                registry.put_many(key, missing)
+        raised = np.array(rows, dtype=bool).reshape(raised.shape)
+
+    # Weighted sums, accumulated in the same order as Person.score so the floats are identical
+    raised[disqualified] = False
+    scores = np.zeros(len(persons))
+    for column, flag in enumerate(flags):
+        scores += np.where(raised[:, column], 100 * model.score_weights["person"][flag], 0.0)
+    scores[disqualified] = 100
+
+    # Write back
+    for i, person in enumerate(persons):
+        if disqualified[i]:
+            person.summary_score = 100
+            continue
+        for column_red_flags in red_flags[i]:
+            person.red_flags += column_red_flags
+        # an individual without any flag keeps the integer score of the per-object path
+        person.summary_score = float(scores[i]) if raised[i].any() else 0
+    return scores
+
+
+def score_companies(companies: list, reuse: frozenset = frozenset()) -> list:
+    # Scores all officers and PSCs of many companies at once, then sets the officers, PSCs and
+    # final scores of each company as Company.officers_weighted_score, pscs_weighted_score and final_score do
+    # (reuse: officers and PSCs keeping their previous score, see Analysis.reuse_previous_scores)
+    persons = []
+    extra_search_terms = []
+    for company in companies:
+        individuals, entities = scored_persons(company)
+        individuals = [person for person in individuals if person not in reuse]
+        persons += individuals
+        extra_search_terms += [company.company_name] * len(individuals)
+        # legal entities are scored on the control graph, one by one
+        for entity in entities:
+            if entity not in reuse:
+                entity.corporate_score()
+
+    score_persons(persons, extra_search_terms)
+    # appointments network flags stay per officer (see Officer.network_score)
+    for person in persons:
+        if isinstance(person, model.Officer):
+            person.network_score()
+
+    final_scores = []
+    for company in companies:
+        officers_scores = [officer.summary_score for officer in company.officers if officer.officer_role in (
+            "director", "secretary", "corporate-secretary", "corporate-director")]
+        if officers_scores:
+            company.summary_score['officers'] = sum(officers_scores) / len(officers_scores)
+        if company.pscs:
+            pscs_scores = [psc.summary_score for psc in company.pscs]
+            company.summary_score['pscs'] = sum(pscs_scores) / len(pscs_scores)
+        if 'officers' in company.summary_score and 'pscs' in company.summary_score:
+            final_scores.append(company.final_score())
+        else:
+            # no officers or no PSCs: no final score (the per-object path fails on these companies)
+            final_scores.append(None)
+    return final_scores
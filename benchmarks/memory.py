@@ -0,0 +1,134 @@
+import argparse
+from datetime import datetime
+import json
+import os
+import platform
+import sys
+import tracemalloc
+
+from mock_server import MockCompaniesHouse
+import model
+
+# Memory footprint of the data model: companies of the mock server parsed into Company / Officer /
+# PersonWithSignificantControl / Filing / Document objects (no HTTP, no scoring), measured per object and per company
+# usage (from the repository root): python -m benchmarks.memory [--baseline previous.json]
+
+
+def parse_company(mock: MockCompaniesHouse, company_number: str) -> model.Company:
+    # same parsers as Analysis.get_api_data, fed with the synthetic API data
+    data = mock.company(company_number)
+    analysis = model.Analysis(model.Company(company_number))
+    analysis.parse_api_company_data(data['profile'])
+    analysis.company.pscs = [analysis.parse_api_psc_item(item) for item in data['pscs']]
+    analysis.company.officers = [analysis.parse_api_officer_item(item) for item in data['officers']]
+    for item in data['filings']:
+        filing = analysis.parse_api_filing_item(item)
+        if filing.document:
+            analysis.parse_api_document_data(filing.document, mock.documents.get(filing.document.document_id))
+        analysis.company.filings.append(filing)
+    return analysis.company
+
+
+def objects(company: model.Company) -> list:
+    # every model object of a parsed company
+    found = [company, company.registered_office] + company.pscs + company.officers + company.filings
+    found += [person.address for person in company.pscs + company.officers if person.address]
+    found += [filing.document for filing in company.filings if filing.document]
+    return found
+
+
+def instance_size(obj) -> int:
+    # object itself plus its attribute dictionary, if any (values are shared with the API data, not counted)
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def run(companies: int, officers: int, pscs: int, filings: int) -> dict:
+    mock = MockCompaniesHouse(officers=officers, pscs=pscs, filings=filings)
+    numbers = ["MEM%05d" % i for i in range(companies)]
+    # API data generated up front, so only the model objects are traced
+    for company_number in numbers:
+        mock.company(company_number)
+    mock.server.server_close()
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    parsed = [parse_company(mock, company_number) for company_number in numbers]
+    traced = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    per_class = {}
+    for company in parsed:
+        for obj in objects(company):
+            entry = per_class.setdefault(type(obj).__name__, {'instances': 0, 'bytes': 0, 'slots': not hasattr(obj, '__dict__')})
+            entry['instances'] += 1
+            entry['bytes'] += instance_size(obj)
+    return {
+        'companies': companies,
+        'objects': sum(entry['instances'] for entry in per_class.values()),
+        'traced_bytes': traced,
+        'bytes_per_company': round(traced / companies),
+        'classes': {
+            name: {
+                'instances': entry['instances'],
+                'bytes_per_instance': round(entry['bytes'] / entry['instances'], 1),
+                'slots': entry['slots'],
+            } for name, entry in per_class.items()
+        },
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    # regressions: more memory per company or per instance than the baseline, beyond the tolerance
+    regressions = []
+    previous = baseline.get('bytes_per_company')
+    if previous and results['bytes_per_company'] > previous * (1 + tolerance):
+        regressions.append("%d bytes per company vs %d" % (results['bytes_per_company'], previous))
+    for name, entry in results['classes'].items():
+        previous = baseline.get('classes', {}).get(name)
+        if previous and entry['bytes_per_instance'] > previous['bytes_per_instance'] * (1 + tolerance):
+            regressions.append("%s: %.1f bytes per instance vs %.1f" % (name, entry['bytes_per_instance'], previous['bytes_per_instance']))
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure the memory footprint of the parsed data model")
+    parser.add_argument('--companies', type=int, default=200)
+    parser.add_argument('--officers', type=int, default=25)
+    parser.add_argument('--pscs', type=int, default=5)
+    parser.add_argument('--filings', type=int, default=100)
+    parser.add_argument('--output', default=None, help="results file (default: output/benchmarks/memory-<timestamp>.json)")
+    parser.add_argument('--baseline', default=None, help="previous results file to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="allowed increase before failing (0.1 = 10%%)")
+    args = parser.parse_args()
+
+    results = dict({
+        'benchmark': 'memory',
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+    }, **run(args.companies, args.officers, args.pscs, args.filings))
+    print("%d companies, %d objects: %.1f KB per company" % (
+        results['companies'], results['objects'], results['bytes_per_company'] / 1024))
+    for name, entry in results['classes'].items():
+        print("%-30s %7d instances  %6.1f bytes each" % (name, entry['instances'], entry['bytes_per_instance']))
+
+    output_path = args.output or os.path.join(
+        'output/benchmarks', "memory-%s.json" % datetime.now().strftime('%Y%m%d-%H%M%S'))
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, "w") as outfile:
+        outfile.write(json.dumps(results, indent=4))
+    print("Results written to " + output_path)
+
+    if args.baseline:
+        with open(args.baseline) as fp:
+            regressions = compare(results, json.load(fp), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import argparse
+from datetime import datetime
+import json
+import os
+import platform
+import sys
+import time
+
+from mock_server import MockCompaniesHouse
+import model
+
+# Parsing speed of the API items into the model objects (Analysis.parse_api_* methods), on large synthetic lists
+# of the mock server (no HTTP)
+# usage (from the repository root): python -m benchmarks.parsing [--baseline previous.json]
+
+
+def parsers(mock: MockCompaniesHouse, company_number: str) -> dict:
+    # endpoint -> (items, function parsing one item)
+    data = mock.company(company_number)
+    documents = [mock.documents[filing['links']['document_metadata'].split('/')[-1]]
+                 for filing in data['filings'] if filing.get('links', {}).get('document_metadata')]
+    analysis = model.Analysis(model.Company(company_number))
+    return {
+        'company': ([data['profile']] * 1000, analysis.parse_api_company_data),
+        'pscs': (data['pscs'], analysis.parse_api_psc_item),
+        'officers': (data['officers'], analysis.parse_api_officer_item),
+        'filings': (data['filings'], analysis.parse_api_filing_item),
+        'documents': (documents, lambda item: analysis.parse_api_document_data(model.Document(), item)),
+    }
+
+
+def run(officers: int, pscs: int, filings: int, repeat: int) -> dict:
+    mock = MockCompaniesHouse(officers=officers, pscs=pscs, filings=filings)
+    mock.server.server_close()
+    results = {}
+    for endpoint, (items, parse) in parsers(mock, 'PARSE001').items():
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for item in items:
+                parse(item)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        results[endpoint] = {
+            'items': len(items),
+            'seconds': round(best, 5),
+            'microseconds_per_item': round(best / len(items) * 1e6, 3),
+            'items_per_second': round(len(items) / best),
+        }
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    # regressions: endpoints parsed slower than the baseline by more than the tolerance
+    regressions = []
+    for endpoint, result in results['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(endpoint)
+        if previous and result['microseconds_per_item'] > previous['microseconds_per_item'] * (1 + tolerance):
+            regressions.append("%s: %.2fus vs %.2fus per item" % (
+                endpoint, result['microseconds_per_item'], previous['microseconds_per_item']))
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the parsing of API items into the model objects")
+    parser.add_argument('--officers', type=int, default=5000)
+    parser.add_argument('--pscs', type=int, default=1000)
+    parser.add_argument('--filings', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default=None, help="results file (default: output/benchmarks/parsing-<timestamp>.json)")
+    parser.add_argument('--baseline', default=None, help="previous results file to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slowdown before failing (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    results = {
+        'benchmark': 'parsing',
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'endpoints': run(args.officers, args.pscs, args.filings, args.repeat),
+    }
+    for endpoint, result in results['endpoints'].items():
+        print("%-10s %6d items  %8.2fus per item  %9d items/s" % (
+            endpoint, result['items'], result['microseconds_per_item'], result['items_per_second']))
+
+    output_path = args.output or os.path.join(
+        'output/benchmarks', "parsing-%s.json" % datetime.now().strftime('%Y%m%d-%H%M%S'))
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, "w") as outfile:
+        outfile.write(json.dumps(results, indent=4))
+    print("Results written to " + output_path)
+
+    if args.baseline:
+        with open(args.baseline) as fp:
+            regressions = compare(results, json.load(fp), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
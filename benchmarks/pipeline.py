@@ -0,0 +1,155 @@
+import argparse
+import contextlib
+from datetime import datetime
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from api_session import ApiSession
+from appointments_graph import AppointmentsGraph
+from control_graph import ControlGraph
+from mock_server import MockCompaniesHouse, offline
+from person_registry import PersonRegistry
+import model
+
+# End-to-end benchmark of Analysis.get_api_data + Analysis.score against the offline mock server
+# usage (from the repository root): python -m benchmarks.pipeline [--baseline previous.json]
+
+scenarios = {
+    # name: (officers, pscs, filings)
+    'small': (5, 2, 20),
+    'medium': (25, 5, 100),
+    'large': (100, 10, 400),
+}
+
+stages = [
+    ('company', lambda analysis: analysis.get_api_company_data()),
+    ('pscs', lambda analysis: analysis.get_api_pscs_data()),
+    ('officers', lambda analysis: analysis.get_api_officers_data()),
+    ('appointments', lambda analysis: analysis.get_api_appointments_data()),
+    ('control', lambda analysis: analysis.get_api_control_data()),
+    ('filings', lambda analysis: analysis.get_api_filings_data()),
+    ('score', lambda analysis: analysis.score()),
+]
+
+
+def run_pipeline(mock: MockCompaniesHouse, company_number: str, workers: int) -> dict:
+    # one full fetch-and-score run, timing each stage
+    # dedicated session without rate limiter: the mock server has no quota
+    session = ApiSession('benchmark', pool_size=workers)
+    analysis = model.Analysis(model.Company(company_number), max_workers=workers, session=session)
+    os.makedirs(os.path.join('output/', company_number), exist_ok=True)
+    # the appointments network and control structure are crawled again, and persons scored again, on every run
+    model.appointments_graph = AppointmentsGraph(workers=workers)
+    model.control_graph = ControlGraph()
+    model.person_registry = PersonRegistry()
+    mock.reset_stats()
+
+    timings = {}
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, stage in stages:
+            stage_start = time.perf_counter()
+            stage(analysis)
+            timings[name] = time.perf_counter() - stage_start
+    wall_time = time.perf_counter() - start
+    session.close()
+
+    return {
+        'wall_time': wall_time,
+        'stages': timings,
+        'requests': mock.stats()['requests'],
+        'final_company_score': analysis.company.summary_score.get('final_company_score'),
+    }
+
+
+def run_scenario(name: str, size: tuple, latency: float, repeat: int, workers: int) -> dict:
+    officers, pscs, filings = size
+    company_number = "BENCH%03d" % list(scenarios).index(name)
+    with MockCompaniesHouse(latency=latency) as mock, offline(mock):
+        mock.add_company(company_number, officers=officers, pscs=pscs, filings=filings)
+
+        # timing runs (best of n), then one run under tracemalloc for the peak memory
+        runs = [run_pipeline(mock, company_number, workers) for _ in range(repeat)]
+        tracemalloc.start()
+        run_pipeline(mock, company_number, workers)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    best = min(runs, key=lambda run: run['wall_time'])
+    return {
+        'officers': officers,
+        'pscs': pscs,
+        'filings': filings,
+        'wall_time': round(best['wall_time'], 4),
+        'stages': {stage: round(seconds, 4) for stage, seconds in best['stages'].items()},
+        'requests': best['requests'],
+        'peak_memory_bytes': peak_memory,
+        'final_company_score': best['final_company_score'],
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    # regressions: scenarios / stages slower than the baseline by more than the tolerance
+    regressions = []
+    for name, result in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        if result['wall_time'] > previous['wall_time'] * (1 + tolerance):
+            regressions.append("%s: wall time %.3fs vs %.3fs" % (name, result['wall_time'], previous['wall_time']))
+        if result['requests'] > previous['requests']:
+            regressions.append("%s: %d requests vs %d" % (name, result['requests'], previous['requests']))
+        if result['peak_memory_bytes'] > previous['peak_memory_bytes'] * (1 + tolerance):
+            regressions.append("%s: peak memory %d vs %d bytes" % (name, result['peak_memory_bytes'], previous['peak_memory_bytes']))
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the fetch-and-score pipeline against the mock server")
+    parser.add_argument('--scenarios', nargs='+', default=list(scenarios), choices=list(scenarios))
+    parser.add_argument('--latency', type=float, default=0.005, help="simulated API latency in seconds")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--output', default=None, help="results file (default: output/benchmarks/pipeline-<timestamp>.json)")
+    parser.add_argument('--baseline', default=None, help="previous results file to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slowdown before failing (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    results = {
+        'benchmark': 'pipeline',
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'latency': args.latency,
+        'workers': args.workers,
+        'scenarios': {},
+    }
+    for name in args.scenarios:
+        result = run_scenario(name, scenarios[name], args.latency, args.repeat, args.workers)
+        results['scenarios'][name] = result
+        print("%-8s %7.3fs  %5d requests  %8.1f KB peak  %s" % (
+            name, result['wall_time'], result['requests'], result['peak_memory_bytes'] / 1024,
+            ", ".join("%s %.3fs" % stage for stage in result['stages'].items())))
+
+    output_path = args.output or os.path.join(
+        'output/benchmarks', "pipeline-%s.json" % datetime.now().strftime('%Y%m%d-%H%M%S'))
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, "w") as outfile:
+        outfile.write(json.dumps(results, indent=4))
+    print("Results written to " + output_path)
+
+    if args.baseline:
+        with open(args.baseline) as fp:
+            regressions = compare(results, json.load(fp), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
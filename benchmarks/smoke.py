@@ -0,0 +1,62 @@
+import argparse
+import contextlib
+import io
+import os
+import runpy
+import sys
+import tempfile
+import traceback
+
+from mock_server import MockCompaniesHouse, offline
+import model
+
+# Runs main.py against the offline mock server with the default configuration (company store, score distribution and
+# address index as configured from the environment, e.g. COMPANY_STORE_PATH), a full analysis then an incremental
+# one, in a temporary working directory so the output folder is left untouched (HTTP and news caches disabled)
+# usage (from the repository root): python -m benchmarks.smoke
+
+
+def run_main(*args: str) -> str:
+    # main.py as from the command line, returns what it printed
+    sys.argv = ['main.py'] + list(args)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        runpy.run_path(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py'),
+                       run_name='__main__')
+    return output.getvalue()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check that main.py runs offline with the default configuration")
+    parser.add_argument('--company-number', default='00000001')
+    args = parser.parse_args()
+
+    # API calls and news lookups go to the mock server, the store, distribution and index are kept as configured
+    # (their paths are relative to the working directory, and they're only opened on first use)
+    with MockCompaniesHouse() as mock, \
+            offline(mock, score_distribution=model.score_distribution, address_index=model.address_index,
+                    company_store=model.company_store), \
+            tempfile.TemporaryDirectory() as directory:
+        model.api_session.rate_limiter = None
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            for flags in (('basic',), ('basic', 'incremental')):
+                try:
+                    output = run_main(args.company_number, *flags)
+                except Exception as e:
+                    traceback.print_exc()
+                    print("FAILED main.py %s %s" % (args.company_number, " ".join(flags)))
+                    return 1
+                print("OK main.py %s %s (%d requests so far)" % (args.company_number, " ".join(flags), mock.request_count))
+                print("\n".join("  " + line for line in output.splitlines() if "score" in line.lower()))
+            if model.company_store:
+                print("Company store: " + str(model.company_store.stats()))
+                model.company_store.close()
+        finally:
+            os.chdir(cwd)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,257 @@
+from array import array
+import re
+import threading
+
+from reference_data import normalise
+
+# edge kinds: how the controller relates to the company it controls
+psc_edge = 0  # corporate person with significant control
+officer_edge = 1  # corporate officer (director, secretary, ...)
+
+
+# countries / registers of legal entities registered with Companies House (normalised)
+uk_registers = {'united kingdom', 'uk', 'great britain', 'england', 'wales', 'scotland', 'northern ireland',
+                'england and wales'}
+
+
+def entity_key(registration_number: str = None, name: str = None, country: str = None) -> str:
+    # node key of a company / legal entity: its Companies House number ('SC123456', '00012345'),
+    # else its normalised name and country (foreign entities)
+    if registration_number:
+        number = re.sub(r'\s+', '', str(registration_number)).upper()
+        return number.zfill(8) if number.isdigit() else number
+    if name:
+        return "name:" + normalise(name) + ("|" + normalise(country) if country else "")
+    return None
+
+
+def is_company_number(key: str) -> bool:
+    # entities registered with Companies House (their PSCs and officers can be fetched)
+    return bool(key) and re.fullmatch(r'[A-Z]{2}\d{6}|\d{8}', key) is not None
+
+
+def is_uk_registered(person) -> bool:
+    # corporate officer / PSC whose registration number was issued by Companies House
+    if person.identification_type == 'uk-limited-company':
+        return True
+    for place in (person.country_registered, person.place_registered):
+        if place:
+            place = normalise(place)
+            if place in uk_registers or 'companies house' in place or 'england and wales' in place \
+                    or 'united kingdom' in place:
+                return True
+    return False
+
+
+def controller_key(person) -> str:
+    # node key of a corporate officer / PSC: the registration number of entities registered elsewhere than in the
+    # UK comes from another register (all-digit numbers would be zero-padded, 'HE123456' looks like a Companies
+    # House number), so they are keyed by name and country
+    if is_uk_registered(person):
+        return entity_key(person.registration_number, person.name)
+    return entity_key(name=person.name, country=person.country_registered or person.place_registered)
+
+
+class ControlGraph:
+    # Company-to-company control graph built from the corporate PSCs and corporate officers of the
+    # companies analysed (edges go from the controlling entity to the company it controls).
+    # Nodes are interned to integers and the controllers of each node kept in typed arrays, appended to as companies
+    # are added. Cycle and layering queries only walk the entities above the one asked about (strongly connected
+    # components and layers in a single Tarjan pass), memoized until the graph changes, so a batch adding companies
+    # between queries doesn't go over the whole graph each time
+    def __init__(self):
+        self.index = {}  # entity key -> node
+        self.keys = []  # node -> entity key
+        self.controllers = []  # node -> array('i') of its controlling nodes
+        self.controller_kinds = []  # node -> array('b') of psc_edge / officer_edge, aligned with controllers
+        self.edges = set()
+        self.individuals = {}  # node -> names of the individuals with significant control
+        self.loaded = set()  # nodes whose PSCs and officers have been added
+        self.claimed = set()  # nodes being loaded (each company is fetched once)
+        self.lock = threading.RLock()
+        self.structures = {}  # node -> (in a cycle, layers above), cleared when an edge is added
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def node(self, key: str) -> int:
+        with self.lock:
+            node = self.index.get(key)
+            if node is None:
+                node = self.index[key] = len(self.keys)
+                self.keys.append(key)
+                self.controllers.append(array('i'))
+                self.controller_kinds.append(array('b'))
+            return node
+
+    def add_edge(self, controller_key: str, company_key: str, kind: int) -> None:
+        with self.lock:
+            edge = (self.node(controller_key), self.node(company_key), kind)
+            if edge not in self.edges:
+                self.edges.add(edge)
+                self.controllers[edge[1]].append(edge[0])
+                self.controller_kinds[edge[1]].append(kind)
+                if self.structures:
+                    self.structures = {}
+
+    def add_company(self, company) -> None:
+        # edges from the current corporate PSCs and corporate officers of a parsed Company (ceased PSCs and
+        # resigned officers no longer control it)
+        company_key = entity_key(company.company_number)
+        with self.lock:
+            node = self.node(company_key)
+            for psc in company.pscs:
+                if psc.is_former():
+                    continue
+                if psc.is_corporate():
+                    key = controller_key(psc)
+                    if key:
+                        self.add_edge(key, company_key, psc_edge)
+                elif psc.name:
+                    self.individuals.setdefault(node, set()).add(psc.name)
+            for officer in company.officers:
+                if officer.is_corporate() and not officer.is_former():
+                    key = controller_key(officer)
+                    if key:
+                        self.add_edge(key, company_key, officer_edge)
+            self.loaded.add(node)
+            self.claimed.discard(node)
+
+    def claim(self, key: str) -> bool:
+        # True if the entity still has to be loaded (and reserves it for the caller)
+        with self.lock:
+            node = self.node(key)
+            if node in self.loaded or node in self.claimed:
+                return False
+            self.claimed.add(node)
+            return True
+
+    def release(self, key: str) -> None:
+        # gives up a claim (e.g. the entity could not be fetched)
+        with self.lock:
+            self.claimed.discard(self.index.get(key))
+
+    def controller_keys(self, key: str) -> list:
+        with self.lock:
+            node = self.index.get(key)
+            if node is None:
+                return []
+            return [self.keys[controller] for controller in self.controllers[node]]
+
+    # Derived structures
+    def strongly_connected_components(self, roots) -> tuple:
+        # iterative Tarjan over the controller edges, from the given nodes (i.e. over them and the entities above
+        # them): returns node -> component, the component sizes and the corporate layers above each component.
+        # A component is closed after every component above it, so its layers are counted when it is closed
+        controllers = self.controllers
+        indices = {}
+        lowlinks = {}
+        on_stack = set()
+        stack = []
+        component = {}
+        sizes = []
+        layer_counts = []
+        for root in roots:
+            if root in indices:
+                continue
+            work = [(root, 0)]
+            indices[root] = lowlinks[root] = len(indices)
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node, edge = work[-1]
+                if edge < len(controllers[node]):
+                    work[-1] = (node, edge + 1)
+                    neighbour = controllers[node][edge]
+                    if neighbour not in indices:
+                        indices[neighbour] = lowlinks[neighbour] = len(indices)
+                        stack.append(neighbour)
+                        on_stack.add(neighbour)
+                        work.append((neighbour, 0))
+                    elif neighbour in on_stack:
+                        lowlinks[node] = min(lowlinks[node], indices[neighbour])
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlinks[parent] = min(lowlinks[parent], lowlinks[node])
+                if lowlinks[node] == indices[node]:
+                    members = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component[member] = len(sizes)
+                        members.append(member)
+                        if member == node:
+                            break
+                    # longest chain of components above (all closed already)
+                    best = 0
+                    for member in members:
+                        for controller in controllers[member]:
+                            above = component[controller]
+                            if above != len(sizes):
+                                best = max(best, layer_counts[above] + 1)
+                    sizes.append(len(members))
+                    layer_counts.append(best)
+        return component, sizes, layer_counts
+
+    def structure(self, node: int) -> tuple:
+        # (in a cycle, layers above) of the node, computed with every entity above it
+        structure = self.structures.get(node)
+        if structure is None:
+            component, sizes, layer_counts = self.strongly_connected_components([node])
+            for member, index in component.items():
+                self.structures[member] = (sizes[index] > 1 or member in self.controllers[member], layer_counts[index])
+            structure = self.structures[node]
+        return structure
+
+    # Queries
+    def in_cycle(self, key: str) -> bool:
+        # the entity (indirectly) controls itself
+        with self.lock:
+            node = self.index.get(key)
+            if node is None:
+                return False
+            return self.structure(node)[0]
+
+    def layers(self, key: str) -> int:
+        # length of the longest chain of corporate controllers above the entity (a cycle counts once)
+        with self.lock:
+            node = self.index.get(key)
+            if node is None:
+                return 0
+            return self.structure(node)[1]
+
+    def ultimate_owners(self, key: str) -> dict:
+        # individuals with significant control over the entity or any corporate PSC above it, and the
+        # corporate PSCs at the top of the chain whose owners are unknown (not loaded, or foreign)
+        with self.lock:
+            node = self.index.get(key)
+            if node is None:
+                return {'individuals': [], 'unresolved': []}
+            individuals = set()
+            unresolved = []
+            seen = {node}
+            queue = [node]
+            while queue:
+                current = queue.pop()
+                individuals.update(self.individuals.get(current, ()))
+                above = [controller for controller, kind in zip(self.controllers[current], self.controller_kinds[current])
+                         if kind == psc_edge]
+                if not above and current not in self.loaded:
+                    unresolved.append(self.keys[current])
+                for controller in above:
+                    if controller not in seen:
+                        seen.add(controller)
+                        queue.append(controller)
+            return {'individuals': sorted(individuals), 'unresolved': sorted(unresolved)}
+
+    def stats(self) -> dict:
+        with self.lock:
+            component, sizes, layer_counts = self.strongly_connected_components(range(len(self.keys)))
+            return {
+                'entities': len(self.keys),
+                'edges': len(self.edges),
+                'loaded': len(self.loaded),
+                'cycles': sum(1 for size in sizes if size > 1),
+            }
@@ -0,0 +1,116 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+import requests
+
+
+def is_transient(error: Exception) -> bool:
+    # HTTP errors other than 429 (Too Many Requests) and 5xx won't go away with a retry (e.g. 404 for a missing document)
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return True
+
+
+class DownloadQueue:
+    # Download stage decoupled from metadata parsing: binaries are queued as soon as they are
+    # known and fetched by a pool of workers, with a cap on the number of bytes in flight
+    def __init__(self, download, workers: int = 4, max_inflight_bytes: int = 64 * 1024 * 1024,
+                 max_retries: int = 3, default_size: int = 1024 * 1024, progress_interval: float = 5.0):
+        # download(*args) -> int: performs one download, returns the number of bytes written, or None if it was skipped
+        self.download = download
+        self.workers = workers
+        self.max_inflight_bytes = max_inflight_bytes
+        self.max_retries = max_retries
+        self.default_size = default_size  # budget reserved when the size isn't advertised
+        self.progress_interval = progress_interval
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.condition = threading.Condition()
+        self.inflight_bytes = 0
+        # Stats
+        self.queued = 0
+        self.completed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.retries = 0
+        self.downloaded_bytes = 0
+        self.start = time.perf_counter()
+        self.last_progress = self.start
+
+    def submit(self, name: str, size: int, *args):
+        with self.condition:
+            self.queued += 1
+        return self.executor.submit(self.run, name, size or self.default_size, args)
+
+    def reserve(self, size: int) -> None:
+        # wait until the file fits in the in-flight budget (a file larger than the whole
+        # budget is still allowed through once nothing else is in flight)
+        with self.condition:
+            while self.inflight_bytes and self.inflight_bytes + size > self.max_inflight_bytes:
+                self.condition.wait()
+            self.inflight_bytes += size
+
+    def release(self, size: int) -> None:
+        with self.condition:
+            self.inflight_bytes -= size
+            self.condition.notify_all()
+
+    def run(self, name: str, size: int, args: tuple) -> bool:
+        self.reserve(size)
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    downloaded = self.download(*args)
+                    break
+                except (OSError, requests.RequestException) as e:
+                    if attempt == self.max_retries or not is_transient(e):
+                        print("Download of '%s' failed after %d attempt(s): %s" % (name, attempt + 1, e))
+                        with self.condition:
+                            self.failed += 1
+                        return False
+                    with self.condition:
+                        self.retries += 1
+                    time.sleep(2 ** attempt)
+        finally:
+            self.release(size)
+
+        with self.condition:
+            if downloaded is not None:
+                self.completed += 1
+                self.downloaded_bytes += downloaded
+            else:
+                self.skipped += 1
+        self.report()
+        return downloaded is not None
+
+    def stats(self) -> dict:
+        with self.condition:
+            elapsed = time.perf_counter() - self.start
+            return {
+                'queued': self.queued,
+                'completed': self.completed,
+                'skipped': self.skipped,
+                'failed': self.failed,
+                'retries': self.retries,
+                'downloaded_bytes': self.downloaded_bytes,
+                'elapsed_seconds': round(elapsed, 2),
+                'bytes_per_second': self.downloaded_bytes / elapsed if elapsed > 0 else 0.0,
+            }
+
+    def report(self, force: bool = False) -> None:
+        now = time.perf_counter()
+        with self.condition:
+            if not force and now - self.last_progress < self.progress_interval:
+                return
+            self.last_progress = now
+        stats = self.stats()
+        done = stats['completed'] + stats['skipped'] + stats['failed']
+        print("Downloads: %d/%d files (%d skipped, %d failed), %.1f MB at %.2f MB/s" % (
+            done, stats['queued'], stats['skipped'], stats['failed'],
+            stats['downloaded_bytes'] / 1024 / 1024, stats['bytes_per_second'] / 1024 / 1024))
+
+    def close(self) -> dict:
+        # waits for every queued download, then prints the final progress line
+        self.executor.shutdown(wait=True)
+        self.report(force=True)
+        return self.stats()
@@ -0,0 +1,195 @@
+import csv
+from datetime import datetime
+import gzip
+import json
+import os
+import threading
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    # optional: without pyarrow, tables are exported as gzipped CSV
+    pyarrow = None
+
+# Columnar export of analysed companies for analytics workloads: Company, Officer, PersonWithSignificantControl,
+# Filing and Document are flattened into one table each (nested objects as prefixed columns, lists and
+# dictionaries as JSON strings), linked by company number / transaction ID / document ID.
+# Every write appends one part file per table (<directory>/<table>/part-<time>-<n>.parquet, or .csv.gz),
+# existing parts are never rewritten, so a table is scanned as a dataset (e.g. pyarrow.dataset, DuckDB
+# read_parquet('<directory>/officers/*.parquet')). A company exported again (re-analysed) appears once per
+# export: keep the row with the latest exported_at.
+
+# column types: 'string', 'int', 'float', 'bool', 'json' (lists and dictionaries, serialised)
+person_columns = [
+    ('id', 'string'), ('name', 'string'), ('title', 'string'), ('forename', 'string'), ('middle_name', 'string'),
+    ('surname', 'string'), ('nationality', 'string'), ('country_of_residence', 'string'), ('dob_year', 'int'),
+    ('dob_month', 'int'), ('etag', 'string'), ('registration_number', 'string'),
+    ('address.premises', 'string'), ('address.address_line_1', 'string'), ('address.address_line_2', 'string'),
+    ('address.postal_code', 'string'), ('address.locality', 'string'), ('address.region', 'string'),
+    ('address.country', 'string'), ('summary_score', 'float'), ('red_flags', 'json'),
+]
+
+# table -> columns (attribute paths of the exported object, '.' for nested objects)
+tables = {
+    'companies': [
+        ('company_number', 'string'), ('company_name', 'string'), ('type', 'string'), ('company_status', 'string'),
+        ('jurisdiction', 'string'), ('date_of_creation', 'string'), ('date_of_cessation', 'string'),
+        ('sic_codes', 'json'), ('can_file', 'bool'), ('has_charges', 'bool'), ('has_insolvency_history', 'bool'),
+        ('has_super_secure_pscs', 'bool'), ('accounts', 'json'), ('confirmation_statement', 'json'), ('etag', 'string'),
+        ('total_pscs_count', 'int'), ('active_pscs_count', 'int'), ('ceased_pscs_count', 'int'),
+        ('total_officers_count', 'int'), ('active_officers_count', 'int'), ('inactive_officers_count', 'int'),
+        ('resigned_officers_count', 'int'),
+        ('registered_office.address_line_1', 'string'), ('registered_office.address_line_2', 'string'),
+        ('registered_office.postal_code', 'string'), ('registered_office.locality', 'string'),
+        ('registered_office.region', 'string'), ('registered_office.country', 'string'),
+        ('registered_office.registered_office_is_in_dispute', 'bool'),
+        ('registered_office.undeliverable_registered_office_address', 'bool'),
+        ('summary_score.officers', 'float'), ('summary_score.pscs', 'float'),
+        ('summary_score.final_company_score', 'float'), ('summary_score.percentile', 'float'),
+    ],
+    'officers': [('company_number', 'string')] + person_columns + [
+        ('appointment', 'string'), ('appointed_on', 'string'), ('occupation', 'string'), ('officer_role', 'string'),
+    ],
+    'pscs': [('company_number', 'string')] + person_columns + [
+        ('kind', 'string'), ('notified_on', 'string'), ('nature_of_control', 'json'),
+    ],
+    'filings': [
+        ('company_number', 'string'), ('transaction_id', 'string'), ('category', 'string'), ('filing_type', 'string'),
+        ('description', 'string'), ('action_date', 'string'), ('date', 'string'), ('paper_filed', 'bool'),
+        ('description_values', 'json'), ('resolutions', 'json'), ('associated_filings', 'json'),
+        ('document.document_id', 'string'),
+    ],
+    'documents': [
+        ('company_number', 'string'), ('transaction_id', 'string'), ('document_id', 'string'), ('barcode', 'string'),
+        ('pages', 'int'), ('category', 'string'), ('significant_date', 'string'), ('significant_date_type', 'string'),
+        ('filename', 'string'), ('created_at', 'string'), ('updated_at', 'string'), ('etag', 'string'),
+        ('pdf_content_length', 'int'), ('json_content_length', 'int'), ('xml_content_length', 'int'),
+        ('xhtml_content_length', 'int'), ('csv_content_length', 'int'),
+    ],
+}
+
+
+def column_name(path: str) -> str:
+    # 'registered_office.postal_code' -> 'registered_office_postal_code'
+    return path.replace('.', '_')
+
+
+def attribute(obj, path: str):
+    # value at an attribute path ('address.postal_code'), dictionaries included ('summary_score.pscs')
+    for name in path.split('.'):
+        if obj is None:
+            return None
+        obj = obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+    return obj
+
+
+def convert(value, column_type: str):
+    if value is None:
+        return None
+    try:
+        if column_type == 'json':
+            return json.dumps(value, sort_keys=True)
+        if column_type == 'int':
+            return int(value)
+        if column_type == 'float':
+            return float(value)
+        if column_type == 'bool':
+            return bool(value)
+    except (TypeError, ValueError) as e:
+        return None
+    return str(value)
+
+
+def rows(company) -> dict:
+    # table -> (object, keys linking it back to the company) of the objects of the company exported to it
+    keys = {'company_number': company.company_number}
+    return {
+        'companies': [(company, keys)],
+        'officers': [(officer, keys) for officer in company.officers],
+        'pscs': [(psc, keys) for psc in company.pscs],
+        'filings': [(filing, keys) for filing in company.filings],
+        'documents': [(filing.document, dict(keys, transaction_id=filing.transaction_id))
+                      for filing in company.filings if filing.document],
+    }
+
+
+class PortfolioExport:
+    def __init__(self, directory: str = 'output/export', file_format: str = None, batch_size: int = 1000):
+        # file_format: 'parquet' (needs pyarrow, default when installed) or 'csv' (gzipped)
+        self.directory = directory
+        self.file_format = file_format or ('parquet' if pyarrow else 'csv')
+        if self.file_format == 'parquet' and not pyarrow:
+            raise ValueError("Parquet export needs pyarrow (pip install pyarrow), use file_format='csv' instead")
+        self.batch_size = batch_size  # companies buffered by add() before a part is written
+        self.buffer = []
+        self.parts = 0
+        self.lock = threading.Lock()
+        for table in tables:
+            os.makedirs(os.path.join(directory, table), exist_ok=True)
+
+    def add(self, company) -> None:
+        # buffers an analysed company, parts are written every batch_size companies (thread-safe)
+        with self.lock:
+            self.buffer.append(company)
+            if len(self.buffer) < self.batch_size:
+                return
+            companies, self.buffer = self.buffer, []
+            self.write(companies)
+
+    def flush(self) -> None:
+        with self.lock:
+            companies, self.buffer = self.buffer, []
+            if companies:
+                self.write(companies)
+
+    def close(self) -> None:
+        self.flush()
+
+    def columns(self, companies: list) -> dict:
+        # table -> column name -> values
+        exported_at = datetime.now().isoformat(timespec='seconds')
+        data = {table: {column_name(path): [] for path, column_type in columns} for table, columns in tables.items()}
+        for company in companies:
+            for table, objects in rows(company).items():
+                columns = data[table]
+                for obj, keys in objects:
+                    for path, column_type in tables[table]:
+                        value = keys[path] if path in keys else attribute(obj, path)
+                        columns[column_name(path)].append(convert(value, column_type))
+        for table, columns in data.items():
+            columns['exported_at'] = [exported_at] * len(columns['company_number'])
+        return data
+
+    def write(self, companies: list) -> dict:
+        # appends one part per table with the rows of the companies (caller holds the lock), returns the paths
+        self.parts += 1
+        part_name = "part-%s-%d-%05d" % (datetime.now().strftime('%Y%m%dT%H%M%S'), os.getpid(), self.parts)
+        paths = {}
+        for table, columns in self.columns(companies).items():
+            path = os.path.join(self.directory, table, part_name + ('.parquet' if self.file_format == 'parquet' else '.csv.gz'))
+            # written under a hidden name first, so readers scanning the folder never see partial parts
+            temp_path = os.path.join(self.directory, table, '.' + os.path.basename(path))
+            if self.file_format == 'parquet':
+                self.write_parquet(table, columns, temp_path)
+            else:
+                self.write_csv(columns, temp_path)
+            os.replace(temp_path, path)
+            paths[table] = path
+        return paths
+
+    @staticmethod
+    def write_parquet(table: str, columns: dict, path: str) -> None:
+        # explicit schema so that every part of a table has the same one (even with all-null columns)
+        types = {'string': pyarrow.string(), 'int': pyarrow.int64(), 'float': pyarrow.float64(),
+                 'bool': pyarrow.bool_(), 'json': pyarrow.string()}
+        schema = pyarrow.schema([(column_name(path), types[column_type]) for path, column_type in tables[table]]
+                                + [('exported_at', pyarrow.string())])
+        pyarrow.parquet.write_table(pyarrow.Table.from_pydict(columns, schema=schema), path, compression='zstd')
+
+    @staticmethod
+    def write_csv(columns: dict, path: str) -> None:
+        with gzip.open(path, 'wt', newline='', encoding='utf-8') as fp:
+            writer = csv.writer(fp)
+            writer.writerow(columns.keys())
+            writer.writerows(zip(*columns.values()))
@@ -0,0 +1,156 @@
+from reference_data import normalise_name
+
+
+def trigrams(key: str) -> list:
+    # padded character trigrams: 'doe' -> [' do', 'doe', 'oe ']
+    padded = ' ' + key + ' '
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def bounded_levenshtein(a: str, b: str, max_distance: int) -> int:
+    # edit distance between a and b, or max_distance + 1 as soon as it's known to be larger
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, character_a in enumerate(a, 1):
+        current = [i]
+        row_minimum = i
+        for j, character_b in enumerate(b, 1):
+            distance = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (character_a != character_b))
+            current.append(distance)
+            if distance < row_minimum:
+                row_minimum = distance
+        if row_minimum > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1] if previous[-1] <= max_distance else max_distance + 1
+
+
+class NameMatcher:
+    # Approximate name screening against a watchlist:
+    # 1. names are normalised (accents, punctuation, titles and word order ignored)
+    # 2. candidates are generated from a trigram inverted index, probing only the rarest
+    #    trigrams of the query (an edit destroys at most 3 trigrams, so with k edits allowed one of
+    #    any 3k + 1 distinct trigrams must survive)
+    # 3. candidates are filtered on length and on the number of trigrams they share with the query
+    #    (at least all but 3k of them), then verified with an edit distance that stops once over the threshold
+    def __init__(self, names: list, threshold: float = 0.85, normaliser=normalise_name):
+        self.threshold = threshold  # minimum similarity (1 - distance / length of the longest name)
+        self.normaliser = normaliser
+        self.keys = []  # normalised names
+        self.names = []  # original names
+        self.exact = {}  # normalised name -> position
+        self.index = {}  # trigram -> set of positions
+        self.lengths = {}  # length -> positions (fallback for very short queries)
+        self.memo = {}  # normalised query -> result
+        for name in names:
+            self.add(name)
+
+    def add(self, name: str) -> None:
+        key = self.normaliser(name)
+        if not key or key in self.exact:
+            return
+        position = len(self.keys)
+        self.keys.append(key)
+        self.names.append(name)
+        self.exact[key] = position
+        for trigram in set(trigrams(key)):
+            self.index.setdefault(trigram, set()).add(position)
+        self.lengths.setdefault(len(key), []).append(position)
+        self.memo = {}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def max_distance(self, length: int) -> int:
+        # largest number of edits still above the similarity threshold for a name of this length
+        # (the longest of the two names is at most length + k, hence the division)
+        return int((1 - self.threshold) * length / self.threshold + 1e-9)
+
+    def candidates(self, key: str, max_distance: int) -> list:
+        query_trigrams = set(trigrams(key))
+        needed = 3 * max_distance + 1
+        if len(query_trigrams) < needed:
+            # too short for the trigram filter: compare with every name of a compatible length
+            positions = []
+            for length in range(len(key) - max_distance, len(key) + max_distance + 1):
+                positions.extend(self.lengths.get(length, ()))
+            return positions
+
+        postings = sorted((self.index.get(trigram, set()) for trigram in query_trigrams), key=len)
+        positions = set()
+        for posting in postings[:needed]:
+            positions.update(posting)
+        minimum_length, maximum_length = len(key) - max_distance, len(key) + max_distance
+        minimum_shared = len(query_trigrams) - 3 * max_distance
+        candidates = []
+        for position in positions:
+            if not minimum_length <= len(self.keys[position]) <= maximum_length:
+                continue
+            shared = 0
+            for posting in postings:
+                if position in posting:
+                    shared += 1
+            if shared >= minimum_shared:
+                candidates.append(position)
+        return candidates
+
+    def match(self, name: str):
+        # (watchlist name, similarity) of the closest match above the threshold, or None
+        if not name:
+            return None
+        key = self.normaliser(name)
+        if not key:
+            return None
+        if key in self.memo:
+            return self.memo[key]
+
+        result = None
+        position = self.exact.get(key)
+        if position is not None:
+            result = (self.names[position], 1.0)
+        else:
+            max_distance = self.max_distance(len(key))
+            if max_distance > 0:
+                best_distance = max_distance + 1
+                best_similarity = 0.0
+                for position in self.candidates(key, max_distance):
+                    candidate = self.keys[position]
+                    distance = bounded_levenshtein(key, candidate, min(best_distance, max_distance))
+                    if distance > max_distance:
+                        continue
+                    similarity = 1 - distance / max(len(key), len(candidate))
+                    if similarity >= self.threshold and similarity > best_similarity:
+                        best_distance, best_similarity = distance, similarity
+                        result = (self.names[position], similarity)
+
+        if len(self.memo) > 100000:
+            self.memo = {}
+        self.memo[key] = result
+        return result
+
+    def __contains__(self, name: str) -> bool:
+        return self.match(name) is not None
+
+    def match_many(self, names: list) -> dict:
+        # batch screening: name -> (watchlist name, similarity) for the names that match
+        matches = {}
+        for name in names:
+            if name not in matches:
+                result = self.match(name)
+                if result:
+                    matches[name] = result
+        return matches
+
+
+def screen_companies(companies: list, matcher: NameMatcher) -> dict:
+    # Screens every officer and PSC of many companies in one pass
+    # returns {company_number: [(person, watchlist name, similarity), ...]} for the companies with hits
+    persons = [(company, person) for company in companies for person in company.officers + company.pscs]
+    matches = matcher.match_many(person.name for company, person in persons)
+    results = {}
+    for company, person in persons:
+        if person.name in matches:
+            watchlist_name, similarity = matches[person.name]
+            results.setdefault(company.company_number, []).append((person, watchlist_name, similarity))
+    return results
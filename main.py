@@ -1,18 +1,27 @@
 import sys
-from model import Company, Analysis
+from model import Company, Analysis, appointments_depth, appointments_graph
 
 ch_number = sys.argv[1]
 flag = sys.argv[2]
+# optional: only fetch and score what changed since the last analysis in the company store
+incremental = len(sys.argv) > 3 and sys.argv[3] == "incremental"
 
 target_company = Company(company_number=ch_number)
 analysis = Analysis(target_company)
 
 if flag == "binary":
     # Same as 1. + download all PDF documents to local output folder - will take longer
-    analysis.get_api_data(download_binary=True)
+    analysis.get_api_data(download_binary=True, incremental=incremental)
 elif flag == "basic":
     # Basic get company raw data from all API endpoints
-    analysis.get_api_data()
+    analysis.get_api_data(incremental=incremental)
 
 # 3. Get the scoring data
 analysis.score()
+
+# 4. HTTP connection reuse stats
+print("API session: " + str(analysis.session))
+if analysis.cache:
+    print("API response cache: " + str(analysis.cache))
+if appointments_depth > 0:
+    print("Appointments graph: " + str(appointments_graph.stats()))
@@ -0,0 +1,406 @@
+import argparse
+from contextlib import contextmanager
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+from urllib.parse import urlparse, parse_qs
+
+# Offline stand-in for the Companies House REST and Document APIs, serving deterministic
+# synthetic companies so the whole pipeline can run (and be benchmarked) without a key or network
+
+forenames = ['James', 'Olivia', 'Mohammed', 'Amelia', 'Chase', 'Isla', 'Noah', 'Ava', 'Leo', 'Mia', 'Tony', 'John']
+surnames = ['Smith', 'Jones', 'Taylor', 'Brown', 'Manders', 'Khan', 'Wilson', 'Evans', 'Blair', 'Doe', 'Patel']
+nationalities = ['British', 'British', 'British', 'French', 'Irish', 'Cypriot', 'Russian', 'American', 'Maltese']
+countries = ['England', 'England', 'Scotland', 'Wales', 'Cyprus', 'Jersey', 'France', 'Panama']
+company_statuses = ['active', 'active', 'active', 'dissolved', 'liquidation', 'dormant']
+filing_types = [
+    ('confirmation-statement', 'CS01', 'confirmation-statement-with-updates'),
+    ('accounts', 'AA', 'accounts-with-accounts-type-dormant'),
+    ('address', 'AD01', 'change-registered-office-address-company-with-date-old-address-new-address'),
+    ('capital', 'SH01', 'capital-allotment-shares'),
+    ('incorporation', 'NEWINC', 'incorporation-company'),
+]
+
+
+class MockCompaniesHouse:
+    def __init__(self, latency: float = 0.0, max_items_per_page: int = 100, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, pdf_size: int = 16 * 1024, seed: int = 0,
+                 officers: int = 5, pscs: int = 2, filings: int = 20, host: str = '127.0.0.1', port: int = 0):
+        self.latency = latency  # seconds added to every response
+        self.max_items_per_page = max_items_per_page  # page size cap of the list endpoints
+        self.error_rate = error_rate  # share of requests answered with a 500
+        self.rate_limit_rate = rate_limit_rate  # share of requests answered with a 429
+        self.pdf_size = pdf_size
+        self.seed = seed
+        # default size of companies that haven't been registered with add_company
+        self.default_size = {'officers': officers, 'pscs': pscs, 'filings': filings}
+        self.sizes = {}
+        self.companies = {}
+        self.documents = {}
+        self.random = random.Random(seed)  # drives errors, shared by all handler threads
+        self.lock = threading.Lock()
+        # Stats
+        self.request_count = 0
+        self.endpoint_counts = {}
+        self.not_modified_count = 0
+        self.server = ThreadingHTTPServer((host, port), self.handler_class())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return "http://%s:%d" % (host, port)
+
+    def add_company(self, company_number: str, officers: int = None, pscs: int = None, filings: int = None) -> None:
+        # registers the size of a synthetic company (data itself is generated on first request)
+        with self.lock:
+            self.sizes[company_number] = {
+                'officers': self.default_size['officers'] if officers is None else officers,
+                'pscs': self.default_size['pscs'] if pscs is None else pscs,
+                'filings': self.default_size['filings'] if filings is None else filings,
+            }
+            self.companies.pop(company_number, None)
+
+    # Synthetic data
+    def company(self, company_number: str) -> dict:
+        with self.lock:
+            if company_number not in self.companies:
+                self.companies[company_number] = self.generate_company(company_number)
+            return self.companies[company_number]
+
+    def generate_company(self, company_number: str) -> dict:
+        size = self.sizes.get(company_number, self.default_size)
+        rnd = random.Random("%s-%s" % (self.seed, company_number))
+        creation_year = rnd.randint(1990, 2022)
+        profile = {
+            'company_number': company_number,
+            'company_name': "%s %s LTD" % (rnd.choice(surnames).upper(), rnd.choice(['TRADING', 'HOLDINGS', 'SWEETS', 'SERVICES'])),
+            'type': 'ltd',
+            'company_status': rnd.choice(company_statuses),
+            'jurisdiction': 'england-wales',
+            'date_of_creation': "%d-%02d-%02d" % (creation_year, rnd.randint(1, 12), rnd.randint(1, 28)),
+            'sic_codes': [rnd.choice(['47240', '62020', '70100', '99999'])],
+            'can_file': True,
+            'has_charges': rnd.random() < 0.2,
+            'has_insolvency_history': rnd.random() < 0.05,
+            'has_super_secure_pscs': False,
+            'accounts': {'next_due': '2023-07-31', 'overdue': False},
+            'confirmation_statement': {'next_due': '2023-10-23', 'overdue': False},
+            'registered_office_address': {
+                'address_line_1': "%d %s Street" % (rnd.randint(1, 200), rnd.choice(surnames)),
+                'postal_code': "SW1Y %dQU" % rnd.randint(1, 9),
+                'locality': 'London',
+                'country': 'England',
+            },
+            'registered_office_is_in_dispute': False,
+            'undeliverable_registered_office_address': False,
+            'links': {'self': '/company/' + company_number},
+        }
+
+        officers = []
+        for i in range(size['officers']):
+            forename, surname = rnd.choice(forenames), rnd.choice(surnames)
+            appointment_id = hashlib.sha1(("%s-officer-%s" % (forename, surname)).encode()).hexdigest()[:27]
+            officers.append({
+                'name': "%s, %s" % (surname.upper(), forename),
+                'officer_role': rnd.choice(['director', 'director', 'director', 'secretary', 'corporate-director']),
+                'appointed_on': "%d-01-01" % rnd.randint(creation_year, 2022),
+                'nationality': rnd.choice(nationalities),
+                'country_of_residence': rnd.choice(countries),
+                'occupation': 'Director',
+                'date_of_birth': {'month': rnd.randint(1, 12), 'year': rnd.randint(1930, 2008)},
+                'address': {'address_line_1': "%d High Street" % rnd.randint(1, 99), 'postal_code': 'EC1A 1BB', 'locality': 'London'},
+                'etag': hashlib.sha1(("%s-%d" % (company_number, i)).encode()).hexdigest(),
+                'links': {
+                    'self': "/company/%s/appointments/%s-%d" % (company_number, company_number, i),
+                    'officer': {'appointments': "/officers/%s/appointments" % appointment_id},
+                },
+            })
+
+        pscs = []
+        for i in range(size['pscs']):
+            forename, surname = rnd.choice(forenames), rnd.choice(surnames)
+            pscs.append({
+                'name': "Mr %s %s" % (forename, surname),
+                'name_elements': {'title': 'Mr', 'forename': forename, 'surname': surname},
+                'kind': 'individual-person-with-significant-control',
+                'notified_on': "%d-01-01" % rnd.randint(creation_year, 2022),
+                'nationality': rnd.choice(nationalities),
+                'country_of_residence': rnd.choice(countries),
+                'date_of_birth': {'month': rnd.randint(1, 12), 'year': rnd.randint(1930, 2008)},
+                'nature_of_control': ['ownership-of-shares-75-to-100-percent'],
+                'address': {'address_line_1': "%d Market Road" % rnd.randint(1, 99), 'postal_code': 'M1 1AE', 'locality': 'Manchester'},
+                'etag': hashlib.sha1(("%s-psc-%d" % (company_number, i)).encode()).hexdigest(),
+                'links': {'self': "/company/%s/persons-with-significant-control/individual/%s-psc-%d" % (company_number, company_number, i)},
+            })
+
+        # Registered office farms and dissolution dates (separate random stream, as below)
+        offices = random.Random("%s-office-%s" % (self.seed, company_number))
+        if offices.random() < 0.2:
+            profile['registered_office_address'] = {
+                'address_line_1': "27 Old Gloucester Street",
+                'postal_code': "WC1N 3AX",
+                'locality': 'London',
+                'country': 'England',
+            }
+        if profile['company_status'] == 'dissolved':
+            profile['date_of_cessation'] = "%d-%02d-%02d" % (
+                min(creation_year + offices.randint(0, 6), 2022), offices.randint(1, 12), offices.randint(1, 28))
+
+        # Control structure (separate random stream so the rest of the data doesn't depend on it):
+        # corporate directors and some corporate PSCs point to other synthetic companies
+        structure = random.Random("%s-control-%s" % (self.seed, company_number))
+        for officer in officers:
+            if officer['officer_role'] == 'corporate-director':
+                officer['identification'] = {
+                    'identification_type': 'uk-limited-company',
+                    'registration_number': "%08d" % structure.randint(1, 500),
+                }
+        if pscs and structure.random() < 0.3:
+            registration_number = "%08d" % structure.randint(1, 500)
+            pscs[0] = {
+                'name': "%s HOLDINGS LIMITED" % structure.choice(surnames).upper(),
+                'kind': 'corporate-entity-person-with-significant-control',
+                'notified_on': pscs[0]['notified_on'],
+                'identification': {
+                    'legal_form': 'Limited Company',
+                    'legal_authority': 'Companies Act 2006',
+                    'country_registered': 'England',
+                    'registration_number': registration_number,
+                },
+                'nature_of_control': ['ownership-of-shares-75-to-100-percent'],
+                'address': pscs[0]['address'],
+                'etag': pscs[0]['etag'],
+                'links': {'self': "/company/%s/persons-with-significant-control/corporate-entity/%s-psc-0" % (company_number, company_number)},
+            }
+
+        filings = []
+        for i in range(size['filings']):
+            category, filing_type, description = rnd.choice(filing_types)
+            transaction_id = hashlib.sha1(("%s-filing-%d" % (company_number, i)).encode()).hexdigest()[:22]
+            document_id = hashlib.sha256(transaction_id.encode()).hexdigest()[:43]
+            filings.append({
+                'transaction_id': transaction_id,
+                'category': category,
+                'type': filing_type,
+                'description': description,
+                'date': "%d-%02d-%02d" % (2022 - i // 12, 12 - i % 12, 10),
+                'action_date': "%d-%02d-%02d" % (2022 - i // 12, 12 - i % 12, 9),
+                'pages': rnd.randint(1, 12),
+                'barcode': "X%07d" % rnd.randint(0, 9999999),
+                'paper_filed': rnd.random() < 0.1,
+                'description_values': {'made_up_date': "%d-12-31" % (2022 - i // 12)},
+                'links': {'document_metadata': self.url + "/document/" + document_id},
+            })
+            self.documents[document_id] = {
+                'company_number': company_number,
+                'barcode': filings[-1]['barcode'],
+                'category': category,
+                'filename': "%s_%s_%s" % (company_number, filing_type.lower(), filings[-1]['date']),
+                'significant_date': None,
+                'significant_date_type': '',
+                'created_at': filings[-1]['date'] + "T10:00:00Z",
+                'etag': hashlib.sha1(document_id.encode()).hexdigest(),
+                'pages': filings[-1]['pages'],
+                'resources': {'application/pdf': {'content_length': self.pdf_size}},
+                'links': {'self': self.url + "/document/" + document_id},
+            }
+
+        profile['accounts']['last_accounts'] = {'type': 'dormant' if profile['sic_codes'] == ['99999'] else 'full'}
+        profile['etag'] = hashlib.sha1(json.dumps(profile, sort_keys=True).encode()).hexdigest()
+        return {'profile': profile, 'officers': officers, 'pscs': pscs, 'filings': filings}
+
+    def appointments(self, officer_id: str) -> list:
+        # deterministic appointments of an officer across a pool of synthetic companies
+        # (a few individuals hold dozens of mandates, mostly with dissolved or dormant companies)
+        rnd = random.Random("%s-officer-%s" % (self.seed, officer_id))
+        count = rnd.randint(25, 40) if rnd.random() < 0.1 else rnd.randint(1, 6)
+        appointments = []
+        for i in range(count):
+            company_number = "%08d" % rnd.randint(1, 500)
+            profile = self.company(company_number)['profile']
+            appointment = {
+                'appointed_to': {
+                    'company_number': company_number,
+                    'company_name': profile['company_name'],
+                    'company_status': profile['company_status'],
+                },
+                'officer_role': rnd.choice(['director', 'director', 'secretary']),
+                'appointed_on': "%d-01-01" % rnd.randint(1990, 2022),
+                'links': {'company': '/company/' + company_number},
+            }
+            if rnd.random() < 0.3:
+                appointment['resigned_on'] = "%d-06-30" % rnd.randint(2000, 2022)
+            appointments.append(appointment)
+        return appointments
+
+    def page(self, items: list, query: dict, counts: dict) -> dict:
+        start_index = int(query.get('start_index', ['0'])[0])
+        items_per_page = min(int(query.get('items_per_page', ['35'])[0]), self.max_items_per_page)
+        page = dict(counts)
+        page.update({
+            'items': items[start_index:start_index + items_per_page],
+            'start_index': start_index,
+            'items_per_page': items_per_page,
+        })
+        return page
+
+    # Routing
+    def route(self, path: str, query: dict):
+        # returns (status, body) - body is a dict (JSON) or bytes (document content)
+        parts = [part for part in path.split('/') if part]
+        if len(parts) >= 2 and parts[0] == 'company':
+            data = self.company(parts[1])
+            if len(parts) == 2:
+                return 'company', 200, data['profile']
+            if parts[2] == 'officers':
+                active = sum(1 for officer in data['officers'] if 'resigned_on' not in officer)
+                return 'officers', 200, self.page(data['officers'], query, {
+                    'total_results': len(data['officers']), 'active_count': active,
+                    'inactive_count': 0, 'resigned_count': len(data['officers']) - active})
+            if parts[2] == 'persons-with-significant-control':
+                return 'pscs', 200, self.page(data['pscs'], query, {
+                    'total_results': len(data['pscs']), 'active_count': len(data['pscs']), 'ceased_count': 0})
+            if parts[2] == 'filing-history':
+                return 'filings', 200, self.page(data['filings'], query, {'total_count': len(data['filings'])})
+        if len(parts) == 3 and parts[0] == 'officers' and parts[2] == 'appointments':
+            appointments = self.appointments(parts[1])
+            return 'appointments', 200, self.page(appointments, query, {
+                'total_results': len(appointments), 'kind': 'personal-appointment', 'is_corporate_officer': False})
+        if len(parts) >= 2 and parts[0] == 'document':
+            with self.lock:
+                document = self.documents.get(parts[1])
+            if document:
+                if len(parts) == 3 and parts[2] == 'content':
+                    header = b"%PDF-1.4\n% " + parts[1].encode() + b"\n"
+                    return 'document_content', 200, header + b"0" * max(self.pdf_size - len(header), 0)
+                return 'document', 200, document
+        return 'unknown', 404, {'errors': [{'error': 'not-found', 'type': 'ch:service'}]}
+
+    def handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # headers and body are separate writes: avoid the delayed-ACK stall on keep-alive connections
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                endpoint, status, body = mock.route(url.path, parse_qs(url.query))
+                with mock.lock:
+                    mock.request_count += 1
+                    mock.endpoint_counts[endpoint] = mock.endpoint_counts.get(endpoint, 0) + 1
+                    draw = mock.random.random()
+                if mock.latency:
+                    time.sleep(mock.latency)
+
+                if draw < mock.rate_limit_rate:
+                    return self.reply(429, b'', {'Retry-After': '0'})
+                if draw < mock.rate_limit_rate + mock.error_rate:
+                    return self.reply(500, b'{"errors": [{"error": "internal-server-error"}]}')
+
+                if isinstance(body, bytes):
+                    return self.reply(status, body, {'Content-Type': 'application/pdf'})
+                payload = json.dumps(body).encode()
+                etag = '"%s"' % hashlib.sha1(payload).hexdigest()
+                if status == 200 and self.headers.get('If-None-Match') == etag:
+                    with mock.lock:
+                        mock.not_modified_count += 1
+                    return self.reply(304, b'', {'ETag': etag})
+                return self.reply(status, payload, {'Content-Type': 'application/json', 'ETag': etag})
+
+            def reply(self, status: int, payload: bytes, headers: dict = None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                if payload:
+                    self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    # Lifecycle
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'requests': self.request_count,
+                'not_modified': self.not_modified_count,
+                'endpoints': dict(self.endpoint_counts),
+            }
+
+    def reset_stats(self) -> None:
+        with self.lock:
+            self.request_count = 0
+            self.not_modified_count = 0
+            self.endpoint_counts = {}
+
+
+def offline_news(query: str) -> list:
+    # Deterministic replacement for model.search_news: a name is "in the news" based on its hash
+    digest = hashlib.sha1(query.lower().encode()).digest()
+    return ["Story about " + query] if digest[0] < 32 else []
+
+
+@contextmanager
+def offline(mock: MockCompaniesHouse, news=offline_news, cache=None, news_cache=None, score_distribution=None,
+            address_index=None, company_store=None):
+    # Points model at the mock server (API endpoints, news lookups, caches, score distribution, address index and
+    # company store) for the duration of the block
+    import model
+
+    saved = (model.company_api, model.officers_api, model.document_api, model.search_news, model.response_cache,
+             model.news_cache, model.score_distribution, model.address_index, model.company_store)
+    model.company_api = mock.url + "/company/"
+    model.officers_api = mock.url + "/officers/"
+    model.document_api = mock.url + "/document/"
+    model.search_news = news
+    model.response_cache = cache
+    model.news_cache = news_cache
+    model.score_distribution = score_distribution
+    model.address_index = address_index
+    model.company_store = company_store
+    try:
+        yield mock
+    finally:
+        (model.company_api, model.officers_api, model.document_api, model.search_news, model.response_cache,
+         model.news_cache, model.score_distribution, model.address_index, model.company_store) = saved
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Offline Companies House mock server")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument('--page-size', type=int, default=100, help="maximum items per page")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of 500 responses")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="share of 429 responses")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    mock = MockCompaniesHouse(latency=args.latency, max_items_per_page=args.page_size, error_rate=args.error_rate,
+                              rate_limit_rate=args.rate_limit_rate, seed=args.seed, port=args.port)
+    print("Mock Companies House API on %s (use CH_API_URL=%s CH_DOCUMENT_API_URL=%s)" % (mock.url, mock.url, mock.url))
+    mock.server.serve_forever()
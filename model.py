@@ -1,17 +1,95 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
+import itertools
 import json
 import os
-import random
-import time
 
 from dotenv import load_dotenv
 from GoogleNews import GoogleNews
-import requests
+
+from address_index import AddressIndex
+from api_session import ApiSession
+from appointments_graph import AppointmentsGraph, is_dormant
+from control_graph import ControlGraph, controller_key, entity_key, is_company_number
+from downloads import DownloadQueue
+from field_mapping import FieldMapping, link_segment, present
+from fuzzy_matching import NameMatcher
+from news_cache import NewsCache
+from person_registry import PersonRegistry
+from rate_limiter import RateLimiter
+from reference_data import ReferenceIndex, load_country_names
+from response_cache import ResponseCache
+from score_distribution import ScoreDistribution
+from store import CompanyStore
 
 # Loading environment variables
 load_dotenv()
 access_token = os.getenv('CH_API_KEY')
 
+# Process-wide rate limiters shared by all outbound calls
+# Companies House allows 600 requests per 5 minutes per API key
+api_rate_limiter = RateLimiter(max_calls=int(os.getenv('CH_RATE_LIMIT', 600)), period=300)
+# Google News has no published quota - roughly one query per second avoids being blocked
+news_rate_limiter = RateLimiter(max_calls=1, period=1)
+
+# News lookups: period searched, concurrency and persistent cache (set NEWS_CACHE_PATH to an empty string to disable)
+news_period = '10y'
+news_workers = int(os.getenv('NEWS_WORKERS', 4))
+news_cache_path = os.getenv('NEWS_CACHE_PATH', 'output/.cache/news.jsonl')
+news_cache = NewsCache(
+    news_cache_path,
+    ttl=float(os.getenv('NEWS_CACHE_TTL', 7 * 24 * 3600)),
+    period=news_period
+) if news_cache_path else None
+
+# Shared pooled HTTP session (keep-alive) used by all API calls
+api_session = ApiSession(
+    access_token,
+    pool_size=int(os.getenv('CH_POOL_SIZE', 10)),
+    timeout=float(os.getenv('CH_TIMEOUT', 30)),
+    rate_limiter=api_rate_limiter
+)
+
+# On-disk cache of JSON API responses revalidated with ETags (set CH_CACHE_DIR to an empty string to disable)
+cache_directory = os.getenv('CH_CACHE_DIR', 'output/.cache/http')
+response_cache = ResponseCache(
+    cache_directory,
+    fresh_for=float(os.getenv('CH_CACHE_FRESH', 0))
+) if cache_directory else None
+
+# Score components memoized per individual across companies (officers and PSCs)
+person_registry = PersonRegistry()
+
+# Network of officers and their other appointments, crawled from the officers of each company analysed
+# and shared by all analyses (set APPOINTMENTS_DEPTH to 0 to disable the crawl)
+appointments_depth = int(os.getenv('APPOINTMENTS_DEPTH', 1))
+appointments_max_nodes = int(os.getenv('APPOINTMENTS_MAX_NODES', 100))
+appointments_graph = AppointmentsGraph(workers=int(os.getenv('APPOINTMENTS_WORKERS', 8)))
+
+# Company-to-company control structure (corporate PSCs and officers) shared by all analyses;
+# corporate controllers registered with Companies House are followed up to CONTROL_DEPTH layers (0 disables)
+control_depth = int(os.getenv('CONTROL_DEPTH', 3))
+control_graph = ControlGraph()
+
+# Companies seen per registered office address, to spot registration farms (set ADDRESS_INDEX_PATH to an empty string to disable)
+address_index_path = os.getenv('ADDRESS_INDEX_PATH', 'output/address_index.jsonl')
+address_index = AddressIndex(address_index_path) if address_index_path else None
+# Registered office thresholds (proportions only count from min_companies_at_address companies)
+min_companies_at_address = 10
+max_short_lived_proportion = 0.3
+max_dissolved_proportion = 0.5
+max_high_risk_proportion = 0.3
+
+# Final scores of all the companies analysed so far, to rank new ones (set SCORE_DISTRIBUTION_PATH to an empty string to disable)
+score_distribution_path = os.getenv('SCORE_DISTRIBUTION_PATH', 'output/score_distribution.jsonl')
+score_distribution = ScoreDistribution(score_distribution_path) if score_distribution_path else None
+
+# Local store of company profiles and PSCs (bulk snapshots loaded with store.py), officers, filings, documents and
+# analyses (API responses and results, replacing the raw_data.json files);
+# entries older than COMPANY_STORE_MAX_AGE seconds are fetched again (set COMPANY_STORE_PATH to an empty string to disable)
+company_store_path = os.getenv('COMPANY_STORE_PATH', 'output/companies.sqlite')
+company_store = CompanyStore(company_store_path, max_age=float(os.getenv('COMPANY_STORE_MAX_AGE', 30 * 24 * 3600))) if company_store_path else None
+
 # Loading reference datasets
 with open('datasets/red_flag_countries.json') as fp:
     red_flag_countries = json.load(fp)['red_flag_countries']
@@ -25,9 +103,42 @@ with open('datasets/score_weights.json') as fp:
 with open('datasets/company_types.json') as fp:
     company_types = json.load(fp)["company_types"]
 
-# API Endpoints
-company_api = "https://api.company-information.service.gov.uk/company/"
-document_api = "https://frontend-doc-api.company-information.service.gov.uk/document/"
+# Reference datasets indexed once for normalised O(1) lookups
+# (case, accents and punctuation insensitive, demonyms / alternative names mapped to countries)
+red_flag_countries_index = ReferenceIndex(red_flag_countries, aliases=load_country_names())
+# Fake / watchlist names are matched approximately (similarity of at least 0.85, e.g. 'Jon Doe' for 'John Doe')
+fake_names_matcher = NameMatcher(fake_names, threshold=0.85)
+company_types_index = ReferenceIndex(company_types)
+
+# Red flags raised on individuals (shared with the vectorized scoring in batch_scoring.py)
+red_flag_messages = {
+    'name_flag': "individual names found in list of fake / generic names",
+    'news_mentions_flag': "news mentions of the individual",
+    'residence_flag': "country of residence in red flag countries",
+    'nationality_flag': "country of nationality in red flag countries",
+    'below_min_age': "individual below 18",
+    'above_max_age': "individual above 70",
+    'has_too_many_mandates': "individual holds too many active appointments",
+    'dissolves_a_lot': "individual sat on many companies since dissolved",
+    'sits_on_many_dormant_companies': "individual sits on many dormant companies",
+    'circular_control': "entity (indirectly) controls itself through other companies",
+    'multilayered_control': "company controlled through several layers of corporate entities",
+}
+min_age = 18
+max_age = 70
+# Appointments network thresholds
+max_active_mandates = 20
+min_dissolved_companies = 5  # and at least half of the appointments
+min_dormant_companies = 3  # and at least half of the active appointments
+# Control structure threshold (corporate entities stacked above a company)
+min_control_layers = 3
+
+# API Endpoints (hosts can be overridden, e.g. to point at mock_server.py)
+api_host = os.getenv('CH_API_URL', "https://api.company-information.service.gov.uk")
+document_api_host = os.getenv('CH_DOCUMENT_API_URL', "https://frontend-doc-api.company-information.service.gov.uk")
+company_api = api_host + "/company/"
+officers_api = api_host + "/officers/"
+document_api = document_api_host + "/document/"
 
 # API Endpoints - company appendices (endpoint + company_number + appendix)
 pscs_api_appendix = "/persons-with-significant-control"
@@ -40,16 +151,68 @@ content_api = "/content"
 # API Endpoints - officers appendices (endpoint + appointment_id + api)
 appointment_api = "/appointments"
 
+# API Pagination - largest page size accepted by the list endpoints (fewer round-trips)
+max_items_per_page = 100
+
 # WebSearch Endpoints
 company_web = "https://find-and-update.company-information.service.gov.uk/company/"
 company_search_web = "https://find-and-update.company-information.service.gov.uk/search?q="
 
 # WebCheck Endpoints
 # Note: old store that will be deprecated and without REST endpoints
-company_store = "https://wck2.companieshouse.gov.uk//compdetails"
+company_store_web = "https://wck2.companieshouse.gov.uk//compdetails"
+
+
+def search_news(query: str) -> list:
+    # Titles of the Google News stories matching the query (without duplicates)
+    news = []
+    # wait for the shared limiter before using API to avoid blocking
+    news_rate_limiter.acquire()
+    googlenews = GoogleNews(period=news_period)
+    googlenews.get_news(query)
+    for story in googlenews.results():
+        if story['title'] not in news:
+            news += [story['title']]
+
+    return news
+
+
+def lookup_news(query: str) -> list:
+    # search_news memoized in the persistent news cache
+    news = news_cache.get(query) if news_cache else None
+    if news is None:
+        news = search_news(query)
+        if news_cache:
+            news_cache.put(query, news)
+    return news
+
+
+def prefetch_news(queries: list, max_workers: int = None) -> None:
+    # Runs the news lookups of many individuals concurrently (still paced by the shared news limiter)
+    # so the later per-person lookups are served from the cache
+    if not news_cache:
+        return
+    queries = [query for query in dict.fromkeys(queries) if query and news_cache.get(query, record=False) is None]
+    if queries:
+        with ThreadPoolExecutor(max_workers=max_workers or news_workers) as executor:
+            list(executor.map(lookup_news, queries))
+
+
+def slot_values(obj) -> dict:
+    # JSON default of the model objects (Company.to_json): the attributes of all their slots, base classes
+    # included, as the objects have no per-instance __dict__
+    return {name: getattr(obj, name) for cls in type(obj).__mro__ for name in getattr(cls, '__slots__', ())
+            if hasattr(obj, name)}
 
 
 class Company:
+    __slots__ = ('company_number', 'company_name', 'type', 'company_status', 'jurisdiction', 'date_of_creation',
+                 'date_of_cessation', 'sic_codes', 'can_file', 'has_charges', 'has_insolvency_history',
+                 'accounts', 'confirmation_statement', 'has_super_secure_pscs', 'etag', 'total_pscs_count',
+                 'active_pscs_count', 'ceased_pscs_count', 'total_officers_count', 'active_officers_count',
+                 'inactive_officers_count', 'resigned_officers_count', 'registered_office', 'pscs', 'officers',
+                 'filings', 'summary_score')
+
     def __init__(self, company_number):
         self.company_number = company_number  # '11004735'
         self.company_name = None  # 'KINGDOM OF SWEETS LTD'
@@ -57,6 +220,7 @@ class Company:
         self.company_status = None  # 'active'
         self.jurisdiction = None  # 'england-wales'
         self.date_of_creation = None  # '2017-10-10'
+        self.date_of_cessation = None  # '2019-03-12' (dissolved companies only)
         self.sic_codes = None  # ['47240']
         # Compliance
         self.can_file = None  # True
@@ -84,13 +248,22 @@ class Company:
         # Output
         self.summary_score = {}
 
-    def officers_weighted_score(self) -> float:
+    def prefetch_news(self, reuse: frozenset = frozenset()) -> None:
+        # batch the news lookups of every officer and PSC that will be scored
+        # (reuse: officers and PSCs keeping their previous score, see Analysis.reuse_previous_scores)
+        persons = [officer for officer in self.officers if officer.officer_role in ("director", "secretary")]
+        persons += [psc for psc in self.pscs if not psc.is_corporate()]
+        persons = [person for person in persons if person not in reuse]
+        prefetch_news([person.news_query(extra_search_term=self.company_name) for person in persons])
+
+    def officers_weighted_score(self, reuse: frozenset = frozenset()) -> float:
         if len(self.officers) > 0:
             officers_scores = []
             for officer in self.officers:
                 if officer.officer_role == "director" or officer.officer_role == "secretary":
-                    # Call score() method
-                    officer.score(extra_search_term=self.company_name)
+                    # Call score() method (unless the previous score is reused)
+                    if officer not in reuse:
+                        officer.score(extra_search_term=self.company_name)
                     # Generate and print summary information
                     summary_string = "- " + officer.name + ": " + str(round(officer.summary_score, 2))
                     if len(officer.red_flags) > 0:
@@ -98,16 +271,15 @@ class Company:
                     print(summary_string)
                     # Add to list
                     officers_scores.append(officer.summary_score)
-                elif officer.officer_role == "corporate-secretary":
-                    default_score = 0.0
-                    summary_string = "- " + officer.name + ": " + str(round(default_score, 2))
-                    print(summary_string)
-                    officers_scores.append(default_score)
-                elif officer.officer_role == "corporate-director":
-                    default_score = 0.0
-                    summary_string = "- " + officer.name + ": " + str(round(default_score, 2))
+                elif officer.officer_role == "corporate-secretary" or officer.officer_role == "corporate-director":
+                    # Legal entities are scored on the control structure above them
+                    if officer not in reuse:
+                        officer.corporate_score()
+                    summary_string = "- " + officer.name + ": " + str(round(officer.summary_score, 2))
+                    if len(officer.red_flags) > 0:
+                        summary_string += " - (Red flags: "+", ".join(officer.red_flags)+")"
                     print(summary_string)
-                    officers_scores.append(default_score)
+                    officers_scores.append(officer.summary_score)
 
             weighted_average = sum(officers_scores) / len(officers_scores)
             self.summary_score['officers'] = weighted_average
@@ -118,12 +290,13 @@ class Company:
             # TODO actually just having no officers decreases your shadiness score
             return 0.0
 
-    def pscs_weighted_score(self) -> float:
+    def pscs_weighted_score(self, reuse: frozenset = frozenset()) -> float:
         if len(self.pscs) > 0:
             pscs_scores = []
             for psc in self.pscs:
-                # Call score() method
-                psc.score(extra_search_term=self.company_name)
+                # Call score() method (unless the previous score is reused)
+                if psc not in reuse:
+                    psc.score(extra_search_term=self.company_name)
                 # Generate and print summary information
                 summary_string = "- " + psc.name+": "+str(round(psc.summary_score, 2))
                 if len(psc.red_flags) > 0:
@@ -141,6 +314,10 @@ class Company:
             # TODO actually just having no PSCs decreases your shadiness score
             return 0.0
 
+    def ultimate_beneficial_owners(self) -> dict:
+        # individuals controlling the company directly or through other companies (see control_graph)
+        return control_graph.ultimate_owners(entity_key(self.company_number))
+
     def final_score(self) -> float:
         final_score = self.summary_score['officers'] * score_weights['company']['officers'] \
                       + self.summary_score['pscs'] * score_weights['company']['pscs']
@@ -167,7 +344,7 @@ class Company:
     # TODO add method to calculate size of final object once populated
 
     def to_json(self):
-        return json.dumps(self, default=lambda obj: obj.__dict__, sort_keys=True, indent=4)
+        return json.dumps(self, default=slot_values, sort_keys=True, indent=4)
 
     def __str__(self) -> str:
         if self.company_name:
@@ -177,6 +354,8 @@ class Company:
 
 
 class Address:
+    __slots__ = ('premises', 'address_line_1', 'address_line_2', 'postal_code', 'locality', 'region', 'country')
+
     def __init__(self):
         self.premises = None  # 'Burnard Accountants, 8 Bankside Building'
         self.address_line_1 = None  # '3rd Floor 13 Charles Ii Street'
@@ -200,23 +379,36 @@ class Address:
 
 
 class RegisteredOffice(Address):
+    __slots__ = ('registered_office_is_in_dispute', 'undeliverable_registered_office_address')
+
     def __init__(self):
         super().__init__()
         self.registered_office_is_in_dispute = None  # False
         self.undeliverable_registered_office_address = None  # False
 
+    def proportion(self, counter: str) -> float:
+        # share of the companies seen at this address with the counter set (see address_index)
+        if not address_index:
+            return 0.0
+        return address_index.proportion(self.postal_code, self.address_line_1, counter, min_companies_at_address)
+
     def has_high_proportion_short_lived_companies(self) -> bool:
-        pass
+        # companies dissolved shortly after incorporation
+        return self.proportion('short_lived') > max_short_lived_proportion
 
     def has_high_proportion_of_dissolved_companies(self) -> bool:
-        pass
+        return self.proportion('dissolved') > max_dissolved_proportion
 
     def has_high_proportion_of_fraudulent_businesses(self) -> bool:
-        # fake registration farm
-        pass
+        # fake registration farm (companies scored as high-risk)
+        return self.proportion('high_risk') > max_high_risk_proportion
 
 
 class Person:
+    __slots__ = ('id', 'title', 'forename', 'middle_name', 'surname', 'name', 'nationality', 'country_of_residence',
+                 'dob_year', 'dob_month', 'etag', 'registration_number', 'identification_type', 'country_registered',
+                 'place_registered', 'address', 'summary_score', 'red_flags')
+
     def __init__(self):
         self.id = None
         self.title = None  # 'Mr'
@@ -229,6 +421,10 @@ class Person:
         self.dob_year = None  # 1981
         self.dob_month = None  # 9
         self.etag = None  # 'c6c04d72359cd8c9700bc17193edfe5d272a2781'
+        self.registration_number = None  # '11004735' (legal entities only: corporate officers and PSCs)
+        self.identification_type = None  # 'uk-limited-company', 'other-corporate-body-or-firm' (corporate officers)
+        self.country_registered = None  # 'England', 'Cyprus' (legal entities)
+        self.place_registered = None  # 'Companies House', 'Registrar Of Companies Nicosia' (legal entities)
         # "Foreign keys"
         self.address = None
         # Output
@@ -259,20 +455,22 @@ class Person:
         else:
             # name preprocessing
             self.name_preprocessing()
+            # individual resolved once for all the flags (see person_registry)
+            key = person_registry.resolve(self) if person_registry else None
 
-            if self.name_flag():
+            if self.memoized_flag(key, 'name_flag'):
                 # person's name is fake / is in bad reputation list / looks random
                 score += 100 * score_weights["person"]["name_flag"]
-            if self.news_mentions_flag(extra_search_term):
+            if self.memoized_flag(key, 'news_mentions_flag', extra_search_term):
                 # person's name is mentioned in the news
                 score += 100 * score_weights["person"]["news_mentions_flag"]
-            if self.nationality_flag():
+            if self.memoized_flag(key, 'nationality_flag'):
                 # person's nationality is from a list of red flag countries
                 score += 100 * score_weights["person"]["nationality_flag"]
-            if self.residence_flag():
+            if self.memoized_flag(key, 'residence_flag'):
                 # person's country of residence is from a list of red flag countries
                 score += 100 * score_weights["person"]["residence_flag"]
-            if self.age_flag():
+            if self.memoized_flag(key, 'age_flag'):
                 # person's age is problematic
                 score += 100 * score_weights["person"]["age_flag"]
 
@@ -281,23 +479,65 @@ class Person:
 
         return score
 
+    def memoized_flag(self, key: str, flag: str, *args) -> bool:
+        # Calls a flag method, reusing its result (and red flags) when the same individual
+        # has already been evaluated for another company (key: see person_registry.resolve)
+        if not person_registry:
+            return getattr(self, flag)(*args)
+
+        component = person_registry.component(flag, *args)
+        cached = person_registry.get(key, component)
+        if cached is not None:
+            raised, red_flags = cached
+            self.red_flags += red_flags
+            return raised
+
+        red_flags_count = len(self.red_flags)
+        raised = getattr(self, flag)(*args)
+        person_registry.put(key, component, raised, self.red_flags[red_flags_count:])
+        return raised
+
+    def is_corporate(self) -> bool:
+        # legal entity rather than an individual
+        return False
+
+    def is_former(self) -> bool:
+        # resigned officer / ceased PSC
+        return False
+
+    def corporate_score(self) -> float:
+        # legal entities: only the control structure above them is scored (see control_graph)
+        score = 0.0
+        if self.circular_or_multilayered_appointments():
+            score += 100 * score_weights["corporate"]["circular_or_multilayered_appointments"]
+        self.summary_score = score
+        return score
+
+    def circular_or_multilayered_appointments(self) -> bool:
+        # company is a director / PSC of a company (that's a director / PSC of a company...) - shell companies:
+        # the entity controls itself through a cycle, or sits on top of several corporate layers
+        key = controller_key(self)
+        circular = control_graph.in_cycle(key)
+        multilayered = 1 + control_graph.layers(key) >= min_control_layers
+        if circular:
+            self.red_flags.append(red_flag_messages['circular_control'])
+        if multilayered:
+            self.red_flags.append(red_flag_messages['multilayered_control'])
+        return circular or multilayered
+
     def is_disqualified_director(self) -> bool:
         # TODO https://find-and-update.company-information.service.gov.uk/register-of-disqualifications/
         return False
 
     def name_flag(self) -> bool:
-        if self.name in fake_names:
-            self.red_flags.append("individual names found in list of fake / generic names")
+        if self.name in fake_names_matcher:
+            self.red_flags.append(red_flag_messages['name_flag'])
             return True
         else:
             return False
 
-    def news_mentions_flag(self, extra_search_term: str = None) -> bool:
-        news = []
-        # sleep before using API to avoid blocking
-        time.sleep(random.uniform(0, 2))
-        googlenews = GoogleNews(period='10y')
-
+    def news_query(self, extra_search_term: str = None) -> str:
+        # Google News query for this individual (None when no usable name)
         if self.forename and self.surname:
             # for PSCs (exact search operand with quotes)
             input_name = '"' + self.forename + " " + self.surname + '"'
@@ -312,40 +552,44 @@ class Person:
 
         else:
             # Can't extract a valid input name
-            return False
+            return None
 
         if extra_search_term:
-            if extra_search_term.split(" ")[-1].upper() in company_types:
+            if extra_search_term.split(" ")[-1] in company_types_index:
                 input_name += ' ' + '"' + ' '.join(extra_search_term.split(" ")[0:-1]) + '"'
             else:
                 input_name += ' ' + '"' + extra_search_term + '"'
 
-        googlenews.get_news(input_name)
-        for story in googlenews.results():
-            if story['title'] not in news:
-                news += [story['title']]
+        return input_name
+
+    def news_mentions_flag(self, extra_search_term: str = None) -> bool:
+        input_name = self.news_query(extra_search_term)
+        if not input_name:
+            return False
+
+        news = lookup_news(input_name)
 
         print(input_name)
         print(news)
 
         if len(news) > 0:
-            self.red_flags.append("news mentions of the individual")
+            self.red_flags.append(red_flag_messages['news_mentions_flag'])
             return True
         else:
             return False
 
     def residence_flag(self) -> bool:
         # Country of residence is a tax haven or country with financial sanctions (e.g. OFAC Sanction List)
-        if self.country_of_residence in red_flag_countries:
-            self.red_flags.append("country of residence in red flag countries")
+        if red_flag_countries_index.match_any(self.country_of_residence):
+            self.red_flags.append(red_flag_messages['residence_flag'])
             return True
         else:
             return False
 
     def nationality_flag(self) -> bool:
         # Country of nationality is a tax haven or country with financial sanctions (e.g. OFAC Sanction List)
-        if self.nationality in red_flag_countries:
-            self.red_flags.append("country of nationality in red flag countries")
+        if red_flag_countries_index.match_any(self.nationality):
+            self.red_flags.append(red_flag_messages['nationality_flag'])
             return True
         else:
             return False
@@ -354,12 +598,12 @@ class Person:
         # If too old or too young to be a director (but could still be a PSC?)
         if self.dob_year:
             current_age = date.today().year - self.dob_year
-            if current_age < 18:
-                self.red_flags.append("individual below 18")
-            elif current_age > 70:
-                self.red_flags.append("individual above 70")
+            if current_age < min_age:
+                self.red_flags.append(red_flag_messages['below_min_age'])
+            elif current_age > max_age:
+                self.red_flags.append(red_flag_messages['above_max_age'])
 
-            return current_age < 18 or current_age > 70
+            return current_age < min_age or current_age > max_age
 
         else:
             # for older appointments there is no PII
@@ -371,13 +615,16 @@ class Person:
 
 
 class Officer(Person):
+    __slots__ = ('appointment', 'appointed_on', 'resigned_on', 'occupation', 'officer_role', 'appointments')
+
     def __init__(self):
         super().__init__()
         self.appointment = None
         self.appointed_on = None  # '2017-10-10'  - TODO appointment might be another object
+        self.resigned_on = None  # '2019-06-30'
         self.occupation = None  # 'Director'
         self.officer_role = None  # 'director'
-        # self.appointments = None  # PK to list of all appointments "/officers/Nd2URspq4bvLy-hwzDZ0_p7FGJw/appointments"
+        self.appointments = None  # all appointments of the individual, from the appointments graph (None if not crawled)
 
     def is_professional(self):
         # TODO method to identify a “professional” corporate secretary services providers based on an official list
@@ -387,30 +634,92 @@ class Officer(Person):
         # TODO there was an appointment that ended
         pass
 
-    def circular_or_multilayered_appointments(self):
-        # TODO company is a directory of a company (that’s a director of a company…) - shell companies;
-        pass
+    def is_corporate(self) -> bool:
+        return bool(self.officer_role) and self.officer_role.startswith("corporate")
 
-    def has_too_many_mandates(self):
-        # TODO too many companies to handle for a single individual;
-        pass
+    def is_former(self) -> bool:
+        return bool(self.resigned_on)
 
-    def dissolves_a_lot(self):
-        pass
+    def score(self, extra_search_term: str = None):
+        # individual flags (see Person.score), then flags from the appointments network
+        super().score(extra_search_term)
+        self.network_score()
+        return self.summary_score
+
+    def network_score(self) -> None:
+        # adds the appointments network flags to summary_score (only raised once the appointments are crawled)
+        if self.appointments is None or self.is_disqualified_director():
+            return
+        score = self.summary_score
+        if self.has_too_many_mandates():
+            score += 100 * score_weights["officer"]["has_too_many_mandates"]
+        if self.dissolves_a_lot():
+            score += 100 * score_weights["officer"]["dissolves_a_lot"]
+        if self.sits_on_many_dormant_companies():
+            score += 100 * score_weights["officer"]["sits_on_many_dormant_companies"]
+        self.summary_score = min(score, 100)
+
+    def active_appointments(self) -> list:
+        return [appointment for appointment in self.appointments or [] if not appointment.get('resigned_on')]
+
+    def has_too_many_mandates(self) -> bool:
+        # too many companies to handle for a single individual
+        if len(self.active_appointments()) > max_active_mandates:
+            self.red_flags.append(red_flag_messages['has_too_many_mandates'])
+            return True
+        else:
+            return False
 
-    def sits_on_many_dormant_companies(self):
-        pass
+    def dissolves_a_lot(self) -> bool:
+        # most of the companies the individual was appointed to have since been dissolved
+        appointments = self.appointments or []
+        dissolved = [appointment for appointment in appointments if appointment.get('company_status') == 'dissolved']
+        if len(dissolved) >= min_dissolved_companies and 2 * len(dissolved) >= len(appointments):
+            self.red_flags.append(red_flag_messages['dissolves_a_lot'])
+            return True
+        else:
+            return False
+
+    def sits_on_many_dormant_companies(self) -> bool:
+        # most of the companies the individual currently sits on are dormant
+        # (needs the company profiles, i.e. an appointments graph crawled to depth 2 or more)
+        active = self.active_appointments()
+        companies = [appointments_graph.company(appointment['company_number']) for appointment in active]
+        dormant = [company for company in companies if company and is_dormant(company['profile'])]
+        if len(dormant) >= min_dormant_companies and 2 * len(dormant) >= len(active):
+            self.red_flags.append(red_flag_messages['sits_on_many_dormant_companies'])
+            return True
+        else:
+            return False
 
 
 class PersonWithSignificantControl(Person):
+    __slots__ = ('kind', 'notified_on', 'ceased_on', 'nature_of_control')
+
     def __init__(self):
         super().__init__()
         self.kind = None  # 'individual-person-with-significant-control'
         self.notified_on = None  # '2017-10-10'
+        self.ceased_on = None  # '2019-06-30'
         self.nature_of_control = None  # ['ownership-of-shares-75-to-100-percent', 'voting-rights-75-to-100-percent', 'right-to-appoint-and-remove-directors']
 
+    def is_corporate(self) -> bool:
+        # 'corporate-entity-person-with-significant-control', 'legal-person-person-with-significant-control'
+        return bool(self.kind) and (self.kind.startswith("corporate-entity") or self.kind.startswith("legal-person"))
+
+    def is_former(self) -> bool:
+        return bool(self.ceased_on)
+
+    def score(self, extra_search_term: str = None):
+        if self.is_corporate():
+            return self.corporate_score()
+        return super().score(extra_search_term)
+
 
 class Filing:
+    __slots__ = ('transaction_id', 'category', 'filing_type', 'description', 'action_date', 'date', 'paper_filed',
+                 'associated_filings', 'resolutions', 'description_values', 'document')
+
     def __init__(self):
         self.transaction_id = None  # 'MzMyMDEyMDgxN2FkaXF6a2N4', 'QUFEUkw1SlZhZGlxemtjeA' - note: Not so random
         self.category = None  # 'confirmation-statement', 'capital', 'resolution', 'accounts', 'address', 'gazette', 'incorporation'
@@ -434,6 +743,11 @@ class Filing:
 
 
 class Document:
+    __slots__ = ('document_id', 'barcode', 'pages', 'category', 'significant_date', 'significant_date_type',
+                 'filename', 'created_at', 'updated_at', 'etag', 'pdf', 'pdf_content_length', 'json',
+                 'json_content_length', 'xml', 'xml_content_length', 'xhtml', 'xhtml_content_length', 'csv',
+                 'csv_content_length', 'binary')
+
     def __init__(self):
         self.document_id = None  # ZFCeh9wBOCh1lchgNjlGhQfzZFn2VDrodCW8hxwoMzU
         self.barcode = None  # 'XAH8U7F5', 'AAE6WDJN', None (when None does it mean there's no document attached?)
@@ -501,12 +815,167 @@ class Document:
         return self.document_id
 
 
+# Field mappings of the API items to the model objects (attribute, path of keys in the JSON item, optional transform),
+# see field_mapping
+address_fields = FieldMapping([
+    ('premises', 'address.premises'),
+    ('address_line_1', 'address.address_line_1'),
+    ('address_line_2', 'address.address_line_2'),
+    ('postal_code', 'address.postal_code'),
+    ('locality', 'address.locality'),
+    ('region', 'address.region'),
+    ('country', 'address.country'),
+])
+
+registered_office_fields = FieldMapping([
+    ('address_line_1', 'registered_office_address.address_line_1'),
+    ('address_line_2', 'registered_office_address.address_line_2'),
+    ('postal_code', 'registered_office_address.postal_code'),
+    ('country', 'registered_office_address.country'),
+    ('locality', 'registered_office_address.locality'),
+    ('region', 'registered_office_address.region'),
+    ('registered_office_is_in_dispute', 'registered_office_is_in_dispute'),
+    ('undeliverable_registered_office_address', 'undeliverable_registered_office_address'),
+])
+
+company_fields = FieldMapping([
+    ('company_name', 'company_name'),
+    ('type', 'type'),
+    ('company_status', 'company_status'),
+    ('jurisdiction', 'jurisdiction'),
+    ('date_of_creation', 'date_of_creation'),
+    ('date_of_cessation', 'date_of_cessation'),
+    ('sic_codes', 'sic_codes'),
+    ('can_file', 'can_file'),
+    ('has_charges', 'has_charges'),
+    ('has_insolvency_history', 'has_insolvency_history'),
+    ('has_super_secure_pscs', 'has_super_secure_pscs'),
+    ('accounts', 'accounts'),
+    ('confirmation_statement', 'confirmation_statement'),
+    ('etag', 'etag'),
+], nested={'registered_office': (RegisteredOffice, registered_office_fields)})
+
+# counts of the first page of the PSCs and officers lists
+pscs_count_fields = FieldMapping([
+    ('total_pscs_count', 'total_results'),
+    ('active_pscs_count', 'active_count'),
+    ('ceased_pscs_count', 'ceased_count'),
+])
+
+officers_count_fields = FieldMapping([
+    ('total_officers_count', 'total_results'),
+    ('active_officers_count', 'active_count'),
+    ('inactive_officers_count', 'inactive_count'),
+    ('resigned_officers_count', 'resigned_count'),
+])
+
+psc_fields = FieldMapping([
+    # extracting individual Primary Key from self link URI
+    # TODO is this a PSCS specific ID?
+    ('id', 'links.self', link_segment(-1)),
+    ('country_of_residence', 'country_of_residence'),
+    ('etag', 'etag'),
+    ('notified_on', 'notified_on'),
+    ('ceased_on', 'ceased_on'),
+    ('dob_month', 'date_of_birth.month'),
+    ('dob_year', 'date_of_birth.year'),
+    ('nature_of_control', 'nature_of_control'),
+    ('nationality', 'nationality'),
+    ('title', 'name_elements.title'),
+    ('forename', 'name_elements.forename'),
+    ('middle_name', 'name_elements.middle_name'),
+    ('surname', 'name_elements.surname'),
+    ('name', 'name'),
+    ('kind', 'kind'),
+    # corporate PSCs only
+    ('registration_number', 'identification.registration_number'),
+    ('country_registered', 'identification.country_registered'),
+    ('place_registered', 'identification.place_registered'),
+], nested={'address': (Address, address_fields)})
+
+officer_fields = FieldMapping([
+    # extracting individual Primary Key from self link URI
+    ('id', 'links.self', link_segment(-1)),
+    # extracting individual Primary Key from officer appointments URI
+    ('appointment', 'links.officer.appointments', link_segment(-2)),
+    ('appointed_on', 'appointed_on'),
+    ('resigned_on', 'resigned_on'),
+    ('nationality', 'nationality'),
+    ('dob_month', 'date_of_birth.month'),
+    ('dob_year', 'date_of_birth.year'),
+    ('officer_role', 'officer_role'),
+    ('occupation', 'occupation'),
+    ('country_of_residence', 'country_of_residence'),
+    ('name', 'name'),
+    ('etag', 'etag'),
+    # corporate officers only
+    ('registration_number', 'identification.registration_number'),
+    ('identification_type', 'identification.identification_type'),
+    ('country_registered', 'identification.country_registered'),
+    ('place_registered', 'identification.place_registered'),
+], nested={'address': (Address, address_fields)})
+
+filing_fields = FieldMapping([
+    ('transaction_id', 'transaction_id'),
+    ('category', 'category'),
+    ('filing_type', 'type'),
+    ('description', 'description'),
+    ('action_date', 'action_date'),
+    ('date', 'date'),
+    ('paper_filed', 'paper_filed'),
+    ('description_values', 'description_values'),
+    ('resolutions', 'resolutions'),
+    ('associated_filings', 'associated_filings'),
+])
+
+# document of a filing history item (metadata completed from the Document endpoint)
+filing_document_fields = FieldMapping([
+    # extracting document Primary Key from URI
+    ('document_id', 'links.document_metadata', link_segment(-1)),
+    ('pages', 'pages'),
+    ('barcode', 'barcode'),
+])
+
+document_fields = FieldMapping([
+    ('category', 'category'),
+    ('significant_date', 'significant_date'),
+    ('significant_date_type', 'significant_date_type'),
+    ('filename', 'filename'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+    ('etag', 'etag'),
+    ('pdf', 'resources.application/pdf', present),
+    ('pdf_content_length', 'resources.application/pdf.content_length'),
+    ('json', 'resources.application/json', present),
+    ('json_content_length', 'resources.application/json.content_length'),
+    ('xml', 'resources.application/xml', present),
+    ('xml_content_length', 'resources.application/xml.content_length'),
+    ('xhtml', 'resources.application/xhtml+xml', present),
+    ('xhtml_content_length', 'resources.application/xhtml+xml.content_length'),
+    ('csv', 'resources.text/csv', present),
+    ('csv_content_length', 'resources.text/csv.content_length'),
+])
+
+
 class Analysis:
-    def __init__(self, company: Company):
+    def __init__(self, company: Company, max_workers: int = 8, session: ApiSession = None,
+                 cache: ResponseCache = None):
         self.company = company
+        # Maximum number of concurrent API calls when fanning out (e.g. one call per document)
+        self.max_workers = max_workers
+        # HTTP session shared across all Analysis instances unless a dedicated one is given
+        self.session = session or api_session
+        # Response cache shared across all Analysis instances unless a dedicated one is given
+        self.cache = cache or response_cache
+        # Incremental mode: last stored snapshot of the company, officers and PSCs unchanged since then
+        # (their previous scores are reused) and what changed
+        self.previous = None
+        self.reused = set()
+        self.changes = {}
 
     # Helper function
-    def api_get_request(self, target_endpoint: str, document_id: str = None) -> json:
+    def api_url(self, target_endpoint: str, resource_id: str = None) -> str:
+        # resource_id: document ID (document endpoints) or officer ID (appointments endpoint)
         if target_endpoint == 'company':
             target_url = company_api + self.company.company_number
         elif target_endpoint == 'pscs':
@@ -516,37 +985,98 @@ class Analysis:
         elif target_endpoint == 'filings':
             target_url = company_api + self.company.company_number + filing_history_api_appendix
         elif target_endpoint == 'document':
-            target_url = document_api + document_id
+            target_url = document_api + resource_id
         elif target_endpoint == 'document_content':
-            target_url = document_api + document_id + content_api
+            target_url = document_api + resource_id + content_api
             # TODO modify Accept request parameter to match Content-Type - to get xhtml instead of pdf
             # https://developer-specs.company-information.service.gov.uk/document-api/reference/document-location/fetch-a-document
 
-        # elif target_endpoint == 'appointments':
-        #     target_url = company_api + self.company.company_number + officers_api_appendix + "/" + "Nd2URspq4bvLy-hwzDZ0_p7FGJw" + appointment_api
-            # target_url = company_api + self.company.company_number + appointment_api + "DaGJaQyWRC-RgllvsMMKPprfNHc"
-            # WFDGm9WCMXDcz4hkc92RPWayyWo
-            # DaGJaQyWRC-RgllvsMMKPprfNHc "id"
-            # Nd2URspq4bvLy-hwzDZ0_p7FGJw "appointment"
-            # print(target_url)
+        elif target_endpoint == 'appointments':
+            # officer ID as found in the officers list ('Nd2URspq4bvLy-hwzDZ0_p7FGJw'), not the appointment ID
+            target_url = officers_api + resource_id + appointment_api
 
         else:
             target_url = '/'
             print('select a valid target endpoint')
 
-        response = requests.get(
-            target_url,
-            auth=requests.auth.HTTPBasicAuth(access_token, '')
-        )
+        return target_url
+
+    def api_get_request(self, target_endpoint: str, resource_id: str = None, params: dict = None) -> json:
+        target_url = self.api_url(target_endpoint, resource_id)
 
         if target_endpoint == 'document_content':
+            response = self.session.get(target_url, params=params)
             return response.content  # return PDF binary
-        else:
-            return response.json()
+
+        # Conditional request: only download the body again if the resource changed
+        cached = self.cache.get(target_url, params) if self.cache else None
+        if cached and self.cache.is_fresh(cached):
+            # recently stored: no request at all
+            self.cache.record('hits')
+            return cached['body']
+        headers = {}
+        if cached and cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+
+        response = self.session.get(target_url, params=params, headers=headers)
+
+        if self.cache:
+            if response.status_code == 304 and cached:
+                self.cache.record('hits')
+                self.cache.touch(target_url, params, cached)
+                return cached['body']
+            self.cache.record('updates' if cached else 'misses')
+
+        api_data = response.json()
+        if self.cache and response.status_code == 200:
+            etag = response.headers.get('ETag')
+            if not etag and isinstance(api_data, dict):
+                etag = api_data.get('etag')
+            self.cache.put(target_url, params, etag, api_data)
+
+        return api_data
+
+    def api_get_pages(self, target_endpoint: str, items_per_page: int = max_items_per_page, resource_id: str = None):
+        # Generator over the pages of a list endpoint (pscs, officers, filings, appointments)
+        # Each page is only requested once the previous one has been consumed, so callers
+        # can stop early (e.g. break out of the loop) without fetching the remaining pages
+        start_index = 0
+        while True:
+            page = self.api_get_request(
+                target_endpoint,
+                resource_id,
+                params={'start_index': start_index, 'items_per_page': items_per_page}
+            )
+            yield page
+
+            if not isinstance(page, dict) or 'errors' in page:
+                return
+            items = page.get('items') or []
+            start_index += len(items)
+            # filing history uses 'total_count', other list endpoints 'total_results'
+            total = page.get('total_results', page.get('total_count'))
+            if not items:
+                return
+            if total is not None and start_index >= total:
+                return
+            if total is None and len(items) < items_per_page:
+                return
+
+    @staticmethod
+    def page_items(pages):
+        # Flattens an iterable of pages into a lazy stream of items
+        for page in pages:
+            try:
+                yield from page['items']
+            except (KeyError, TypeError) as e:
+                pass
 
     # Wrapper
-    def get_api_data(self, download_binary: bool = False) -> None:
+    def get_api_data(self, download_binary: bool = False, incremental: bool = False) -> dict:
         # wrapper function to gather data from the various endpoints
+        # incremental: diff against the last analysis in the company store - the profile and the PSCs and officers
+        # lists are fetched again (conditional requests), but only new filings, their documents and the people new or
+        # changed since then (other etag) are fetched, crawled and scored; returns what changed
 
         # 0. Create local subfolder to store data
         output_directory = self.company.company_number
@@ -557,587 +1087,412 @@ class Analysis:
         except OSError as error:
             print("Output directory '%s' cannot be created" % output_directory)
 
+        # Last snapshot (full analysis when there's none)
+        self.previous = company_store.get_analysis(self.company.company_number) if incremental and company_store else None
+        incremental = self.previous is not None
+
         # 1. Data from Company endpoint
-        self.get_api_company_data()
+        self.get_api_company_data(use_store=not incremental)
+        self.index_address()
+        if incremental:
+            self.changes['company'] = self.company.etag is None or self.company.etag != self.previous.get('etag')
 
         # 2. Data from PSCS endpoint
-        self.get_api_pscs_data()
+        self.get_api_pscs_data(use_store=not incremental)
 
         # 3. Data from Officers endpoint
         self.get_api_officers_data()
 
-        # 4. Data from Filings History, Document, and Document Content endpoints
-        if download_binary:
-            self.get_api_filings_data(download_binary=True)
-        else:
-            self.get_api_filings_data()
+        if incremental:
+            self.changes['pscs'] = self.reuse_previous_scores(self.company.pscs, self.previous.get('pscs'))
+            self.changes['officers'] = self.reuse_previous_scores(self.company.officers, self.previous.get('officers'))
 
-        # 5. Store resulting aggregated JSON in local folder
-        with open(output_path + "/raw_data.json", "w") as outfile:
-            outfile.write(self.company.to_json())
+        # 3b. Appointments network of the officers
+        if appointments_depth > 0:
+            self.get_api_appointments_data()
 
-    # Parsing of API data
-    def get_api_company_data(self) -> None:
-        api_data = self.api_get_request('company')
-
-        # Company data
-        try:
-            self.company.company_name = api_data['company_name']
-        except (KeyError, TypeError) as e:
-            # TODO better message
-            pass
-
-        try:
-            self.company.type = api_data['type']
-        except (KeyError, TypeError) as e:
-            pass
-
-        try:
-            self.company.company_status = api_data['company_status']
-        except (KeyError, TypeError) as e:
-            pass
-
-        try:
-            self.company.jurisdiction = api_data['jurisdiction']
-        except (KeyError, TypeError) as e:
-            pass
-
-        try:
-            self.company.date_of_creation = api_data['date_of_creation']
-        except (KeyError, TypeError) as e:
-            pass
-
-        try:
-            self.company.sic_codes = api_data['sic_codes']
-        except (KeyError, TypeError) as e:
-            pass
-
-        try:
-            self.company.can_file = api_data['can_file']
-        except (KeyError, TypeError) as e:
-            pass
-
-        try:
-            self.company.has_charges = api_data['has_charges']
-        except (KeyError, TypeError) as e:
-            pass
-
-        try:
-            self.company.has_insolvency_history = api_data['has_insolvency_history']
-        except (KeyError, TypeError) as e:
-            pass
-
-        try:
-            self.company.has_super_secure_pscs = api_data['has_super_secure_pscs']
-        except (KeyError, TypeError) as e:
-            pass
-
-        try:
-            self.company.accounts = api_data['accounts']
-        except (KeyError, TypeError) as e:
-            pass
-
-        try:
-            self.company.confirmation_statement = api_data['confirmation_statement']
-        except (KeyError, TypeError) as e:
-            pass
-
-        try:
-            self.company.etag = api_data['etag']
-        except (KeyError, TypeError) as e:
-            pass
-
-        # Registered Office data
-        self.company.registered_office = RegisteredOffice()
-
-        try:
-            self.company.registered_office.address_line_1 = api_data['registered_office_address']['address_line_1']
-        except (KeyError, TypeError) as e:
-            pass
-
-        try:
-            self.company.registered_office.address_line_2 = api_data['registered_office_address']['address_line_2']
-        except (KeyError, TypeError) as e:
-            pass
-
-        try:
-            self.company.registered_office.postal_code = api_data['registered_office_address']['postal_code']
-        except (KeyError, TypeError) as e:
-            pass
-
-        try:
-            self.company.registered_office.country = api_data['registered_office_address']['country']
-        except (KeyError, TypeError) as e:
-            pass
-
-        try:
-            self.company.registered_office.locality = api_data['registered_office_address']['locality']
-        except (KeyError, TypeError) as e:
-            pass
+        # 3c. Control structure above the company (corporate PSCs and officers)
+        if incremental and not self.changes['pscs'] and not self.changes['officers']:
+            # same controllers as last time
+            control_graph.add_company(self.company)
+        else:
+            self.get_api_control_data()
 
-        try:
-            self.company.registered_office.region = api_data['registered_office_address']['region']
-        except (KeyError, TypeError) as e:
-            pass
+        # 4. Data from Filings History, Document, and Document Content endpoints
+        self.get_api_filings_data(download_binary=download_binary, incremental=incremental)
+        if incremental:
+            print("Changes since the last analysis: " + str(self.changes))
 
-        try:
-            self.company.registered_office.registered_office_is_in_dispute = api_data['registered_office_is_in_dispute']
-        except (KeyError, TypeError) as e:
-            pass
+        # 5. Store resulting aggregated JSON in the company store (local folder without a store)
+        if company_store:
+            company_store.put_analysis(self.company.company_number, self.company.to_json())
+        else:
+            with open(output_path + "/raw_data.json", "w") as outfile:
+                outfile.write(self.company.to_json())
+        return self.changes
+
+    def reuse_previous_scores(self, persons: list, previous_persons: list) -> int:
+        # persons unchanged since the last snapshot (same ID and etag, scored then) get their previous score,
+        # red flags and appointments back and won't be crawled or scored again; returns the number of new or
+        # changed persons
+        previous = {(person.get('id'), person.get('etag')): person for person in previous_persons or []
+                    if person.get('etag') and person.get('summary_score') is not None}
+        changed = 0
+        for person in persons:
+            snapshot = previous.get((person.id, person.etag))
+            if snapshot is None:
+                changed += 1
+                continue
+            if not person.is_corporate():
+                person.name_preprocessing()
+            person.summary_score = snapshot['summary_score']
+            person.red_flags = snapshot.get('red_flags') or []
+            if isinstance(person, Officer):
+                person.appointments = snapshot.get('appointments')
+            self.reused.add(person)
+        return changed
+
+    def load_stored_data(self) -> bool:
+        # rebuilds the company from the company store only (no API calls), to re-score companies
+        # analysed before; False if the company or its PSCs, officers or filings aren't stored
+        if not company_store:
+            return False
+        number = self.company.company_number
+        profile = company_store.get_profile(number, fresh=False)
+        pscs = company_store.get_pscs(number, fresh=False)
+        officers = company_store.get_officers(number, fresh=False)
+        filings = company_store.get_filings(number, fresh=False)
+        if profile is None or pscs is None or officers is None or filings is None:
+            return False
 
-        try:
-            self.company.registered_office.undeliverable_registered_office_address = api_data['undeliverable_registered_office_address']
-        except (KeyError, TypeError) as e:
-            pass
+        self.parse_api_company_data(profile)
+        self.company.total_pscs_count = len(pscs)
+        self.company.ceased_pscs_count = sum(1 for item in pscs if item.get('ceased_on'))
+        self.company.active_pscs_count = self.company.total_pscs_count - self.company.ceased_pscs_count
+        self.company.pscs = [self.parse_api_psc_item(item) for item in pscs]
+        self.company.total_officers_count = len(officers)
+        self.company.resigned_officers_count = sum(1 for item in officers if item.get('resigned_on'))
+        self.company.active_officers_count = self.company.total_officers_count - self.company.resigned_officers_count
+        self.company.officers = [self.parse_api_officer_item(item) for item in officers]
+        self.restore_appointments()
+        documents = company_store.get_documents(number)
+        for item in filings:
+            filing = self.parse_api_filing_item(item)
+            if filing.document and filing.document.document_id in documents:
+                self.parse_api_document_data(filing.document, documents[filing.document.document_id])
+            self.company.filings.append(filing)
+        control_graph.add_company(self.company)
+        return True
+
+    def restore_appointments(self) -> None:
+        # appointments of the officers from the last stored analysis, and the companies of their network found in
+        # the store, added to the appointments graph so the network flags are raised again without API calls
+        previous = company_store.get_analysis(self.company.company_number) or {}
+        appointments = {item.get('appointment'): item['appointments'] for item in previous.get('officers') or []
+                        if item.get('appointment') and item.get('appointments') is not None}
+        for officer in self.company.officers:
+            if officer.appointment not in appointments:
+                continue
+            officer.appointments = appointments[officer.appointment]
+            appointments_graph.add(('officer', officer.appointment), officer.appointments)
+            if appointments_depth < 2:
+                continue
+            for appointment in officer.appointments:
+                number = appointment.get('company_number')
+                if not number or appointments_graph.company(number):
+                    continue
+                profile = company_store.get_profile(number, fresh=False)
+                officers = company_store.get_officers(number, fresh=False)
+                if profile is not None and officers is not None:
+                    appointments_graph.add(('company', number), self.company_node(profile, officers))
 
-    def get_api_pscs_data(self) -> None:
-        api_data = self.api_get_request('pscs')
+    # Parsing of API data
+    def get_api_company_data(self, use_store: bool = True) -> None:
+        # local store first (bulk snapshot or recent analysis), API otherwise
+        api_data = company_store.get_profile(self.company.company_number) if company_store and use_store else None
+        if api_data is None:
+            api_data = self.api_get_request('company')
+            if company_store and isinstance(api_data, dict) and 'company_number' in api_data:
+                company_store.put_companies([api_data], source='api')
+        self.parse_api_company_data(api_data)
+
+    def parse_api_company_data(self, api_data: dict) -> None:
+        # Company and Registered Office data
+        company_fields.apply(self.company, api_data)
+
+    def get_api_pscs_data(self, use_store: bool = True) -> None:
+        # local store first (bulk snapshot or recent analysis), API otherwise
+        items = company_store.get_pscs(self.company.company_number) if company_store and use_store else None
+        if items is not None:
+            self.company.total_pscs_count = len(items)
+            self.company.ceased_pscs_count = sum(1 for item in items if item.get('ceased_on'))
+            self.company.active_pscs_count = self.company.total_pscs_count - self.company.ceased_pscs_count
+            self.company.pscs = [self.parse_api_psc_item(item) for item in items]
+            return
+
+        pages = self.api_get_pages('pscs')
+        api_data = next(pages)
         if not 'errors' in api_data:
         # if True:
 
             # Company data
-            try:
-                self.company.total_pscs_count = api_data['total_results']
-            except (KeyError, TypeError) as e:
-                pass
-
-            try:
-                self.company.active_pscs_count = api_data['active_count']
-            except (KeyError, TypeError) as e:
-                pass
-
-            try:
-                self.company.ceased_pscs_count = api_data['ceased_count']
-            except (KeyError, TypeError) as e:
-                pass
+            pscs_count_fields.apply(self.company, api_data)
 
             # PSCS
             print(api_data)
-            for item in api_data['items']:
-                psc = PersonWithSignificantControl()
-
-                try:
-                    # extracting individual Primary Key from self link URI
-                    # TODO is this a PSCS specific ID?
-                    psc.id = item['links']['self'].split('/')[-1]
-                except (KeyError, TypeError) as e:
-                    pass
-
-                try:
-                    psc.country_of_residence = item['country_of_residence']
-                except (KeyError, TypeError) as e:
-                    pass
-
-                try:
-                    psc.etag = item['etag']
-                except (KeyError, TypeError) as e:
-                    pass
-
-                try:
-                    psc.notified_on = item['notified_on']
-                except (KeyError, TypeError) as e:
-                    pass
-
-                try:
-                    psc.dob_month = item['date_of_birth']['month']
-                except (KeyError, TypeError) as e:
-                    pass
-
-                try:
-                    psc.dob_year = item['date_of_birth']['year']
-                except (KeyError, TypeError) as e:
-                    pass
-
-                try:
-                    psc.nature_of_control = item['nature_of_control']
-                except (KeyError, TypeError) as e:
-                    pass
-
-                try:
-                    psc.nationality = item['nationality']
-                except (KeyError, TypeError) as e:
-                    pass
-
-                try:
-                    psc.title = item['name_elements']['title']
-                except (KeyError, TypeError) as e:
-                    pass
-
-                try:
-                    psc.forename = item['name_elements']['forename']
-                except (KeyError, TypeError) as e:
-                    pass
-
-                try:
-                    psc.middle_name = item['name_elements']['middle_name']
-                except (KeyError, TypeError) as e:
-                    pass
-
-                try:
-                    psc.surname = item['name_elements']['surname']
-                except (KeyError, TypeError) as e:
-                    pass
-
-                try:
-                    psc.name = item['name']
-                except (KeyError, TypeError) as e:
-                    pass
-
-                try:
-                    psc.kind = item['kind']
-                except (KeyError, TypeError) as e:
-                    pass
-
-                # Address
-                psc.address = Address()
-
-                try:
-                    psc.address.premises = item['address']['premises']
-                except (KeyError, TypeError) as e:
-                    pass
-
-                try:
-                    psc.address.address_line_1 = item['address']['address_line_1']
-                except (KeyError, TypeError) as e:
-                    pass
-
-                try:
-                    psc.address.address_line_2 = item['address']['address_line_2']
-                except (KeyError, TypeError) as e:
-                    pass
-
-                try:
-                    psc.address.postal_code = item['address']['postal_code']
-                except (KeyError, TypeError) as e:
-                    pass
-
-                try:
-                    psc.address.locality = item['address']['locality']
-                except (KeyError, TypeError) as e:
-                    pass
-
-                try:
-                    psc.address.region = item['address']['region']
-                except (KeyError, TypeError) as e:
-                    pass
-
-                try:
-                    psc.address.country = item['address']['country']
-                except (KeyError, TypeError) as e:
-                    pass
-
-                self.company.pscs.append(psc)
+            items = []
+            for item in self.page_items(itertools.chain([api_data], pages)):
+                items.append(item)
+                self.company.pscs.append(self.parse_api_psc_item(item))
+            if company_store:
+                company_store.put_company_items('pscs', self.company.company_number, items)
+
+    @staticmethod
+    def parse_api_psc_item(item: dict) -> PersonWithSignificantControl:
+        # PSC from an item of the PSCs list (API pages and bulk PSC snapshot lines alike)
+        return psc_fields.parse(PersonWithSignificantControl, item)
 
     def get_api_officers_data(self) -> None:
-        api_data = self.api_get_request('officers')
+        pages = self.api_get_pages('officers')
+        api_data = next(pages)
 
         # Company data
-        try:
-            self.company.total_officers_count = api_data['total_results']
-        except (KeyError, TypeError) as e:
-            pass
-
-        try:
-            self.company.active_officers_count = api_data['active_count']
-        except (KeyError, TypeError) as e:
-            pass
-
-        try:
-            self.company.inactive_officers_count = api_data['inactive_count']
-        except (KeyError, TypeError) as e:
-            pass
-
-        try:
-            self.company.resigned_officers_count = api_data['resigned_count']
-        except (KeyError, TypeError) as e:
-            pass
+        officers_count_fields.apply(self.company, api_data)
 
         # Officers
-        for item in api_data['items']:
-            officer = Officer()
-
-            try:
-                # extracting individual Primary Key from self link URI
-                officer.id = item['links']['self'].split('/')[-1]
-            except (KeyError, TypeError) as e:
-                pass
-
-            try:
-                # extracting individual Primary Key from officer appointments URI
-                officer.appointment = item['links']['officer']['appointments'].split('/')[-2]
-            except (KeyError, TypeError) as e:
-                pass
-
-            try:
-                officer.appointed_on = item['appointed_on']
-            except (KeyError, TypeError) as e:
-                pass
-
-            try:
-                officer.nationality = item['nationality']
-            except (KeyError, TypeError) as e:
-                pass
-
-            try:
-                officer.dob_month = item['date_of_birth']['month']
-            except (KeyError, TypeError) as e:
-                pass
-
-            try:
-                officer.dob_year = item['date_of_birth']['year']
-            except (KeyError, TypeError) as e:
-                pass
-
-            try:
-                officer.officer_role = item['officer_role']
-            except (KeyError, TypeError) as e:
-                pass
-
-            try:
-                officer.occupation = item['occupation']
-            except (KeyError, TypeError) as e:
-                pass
-
-            try:
-                officer.country_of_residence = item['country_of_residence']
-            except (KeyError, TypeError) as e:
-                pass
-
-            try:
-                officer.name = item['name']
-            except (KeyError, TypeError) as e:
-                pass
-
-            # Address
-            officer.address = Address()
-
-            try:
-                officer.address.premises = item['address']['premises']
-            except (KeyError, TypeError) as e:
-                pass
-
-            try:
-                officer.address.address_line_1 = item['address']['address_line_1']
-            except (KeyError, TypeError) as e:
-                pass
-
-            try:
-                officer.address.address_line_2 = item['address']['address_line_2']
-            except (KeyError, TypeError) as e:
-                pass
-
-            try:
-                officer.address.postal_code = item['address']['postal_code']
-            except (KeyError, TypeError) as e:
-                pass
-
-            try:
-                officer.address.locality = item['address']['locality']
-            except (KeyError, TypeError) as e:
-                pass
-
-            try:
-                officer.address.region = item['address']['region']
-            except (KeyError, TypeError) as e:
-                pass
-
+        items = []
+        for item in self.page_items(itertools.chain([api_data], pages)):
+            items.append(item)
+            self.company.officers.append(self.parse_api_officer_item(item))
+        if company_store and isinstance(api_data, dict) and 'errors' not in api_data:
+            company_store.put_company_items('officers', self.company.company_number, items)
+
+    @staticmethod
+    def parse_api_officer_item(item: dict) -> Officer:
+        # Officer from an item of the officers list (API pages and company store alike)
+        return officer_fields.parse(Officer, item)
+
+    def get_api_appointments_data(self) -> None:
+        # crawls the appointments network from the officers of the company (see appointments_graph)
+        # (officers whose previous score is reused keep their previous appointments)
+        officers = [officer for officer in self.company.officers if officer.appointment and officer not in self.reused]
+        if not officers:
+            return
+        appointments_graph.crawl(
+            [officer.appointment for officer in officers],
+            self.api_get_officer_node,
+            self.api_get_company_node,
+            max_depth=appointments_depth,
+            max_nodes=appointments_max_nodes,
+            company_number=self.company.company_number
+        )
+        for officer in officers:
+            officer.appointments = appointments_graph.appointments(officer.appointment)
+
+    def api_get_officer_node(self, officer_id: str) -> list:
+        # all appointments of an officer (None if they can't be fetched)
+        pages = self.api_get_pages('appointments', resource_id=officer_id)
+        api_data = next(pages)
+        if not isinstance(api_data, dict) or 'errors' in api_data:
+            return None
+
+        appointments = []
+        for item in self.page_items(itertools.chain([api_data], pages)):
+            appointed_to = item.get('appointed_to') or {}
+            appointments.append({
+                'company_number': appointed_to.get('company_number'),
+                'company_name': appointed_to.get('company_name'),
+                'company_status': appointed_to.get('company_status'),
+                'officer_role': item.get('officer_role'),
+                'appointed_on': item.get('appointed_on'),
+                'resigned_on': item.get('resigned_on'),
+            })
+        return appointments
+
+    def api_get_company_node(self, company_number: str) -> dict:
+        # profile and officer IDs of another company of the network (None if it can't be fetched)
+        analysis = Analysis(Company(company_number=company_number), session=self.session, cache=self.cache)
+        api_data = analysis.api_get_request('company')
+        if not isinstance(api_data, dict) or 'errors' in api_data:
+            return None
+
+        items = list(analysis.page_items(analysis.api_get_pages('officers')))
+        if company_store and 'company_number' in api_data:
+            # kept for the next analyses and for re-scoring from the store (see load_stored_data)
+            company_store.put_companies([api_data], source='api')
+            company_store.put_company_items('officers', company_number, items)
+        return self.company_node(api_data, items)
+
+    @staticmethod
+    def company_node(profile: dict, officers: list) -> dict:
+        # appointments graph data of a company: profile and officer IDs (from API items)
+        officer_ids = []
+        for item in officers:
             try:
-                officer.address.country = item['address']['country']
+                officer_ids.append(item['links']['officer']['appointments'].split('/')[-2])
             except (KeyError, TypeError) as e:
                 pass
-
-            self.company.officers.append(officer)
-
-    def get_api_filings_data(self, download_binary: bool = False) -> None:
-        api_data = self.api_get_request('filings')
+        profile = {key: profile.get(key) for key in ('company_name', 'company_status', 'sic_codes', 'accounts')}
+        return {'profile': profile, 'officers': officer_ids}
+
+    def get_api_control_data(self) -> None:
+        # adds the company to the control graph, then follows its corporate controllers registered with
+        # Companies House, one layer at a time and each of them once (see control_graph)
+        control_graph.add_company(self.company)
+        layer = [self.company]
+        for depth in range(control_depth):
+            controllers = []
+            for company in layer:
+                for person in company.pscs + company.officers:
+                    if person.is_corporate() and not person.is_former():
+                        key = controller_key(person)
+                        if is_company_number(key) and control_graph.claim(key):
+                            controllers.append(key)
+            if not controllers:
+                break
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                layer = [company for company in executor.map(self.api_get_controller, controllers) if company]
+
+    def api_get_controller(self, company_number: str):
+        # PSCs and officers of a controlling company, added to the control graph (None if they can't be fetched)
+        analysis = Analysis(Company(company_number=company_number), session=self.session, cache=self.cache)
+        try:
+            analysis.get_api_pscs_data()
+            analysis.get_api_officers_data()
+        except Exception as e:
+            print("Control structure: '%s' could not be fetched: %r" % (company_number, e))
+            control_graph.release(company_number)
+            return None
+        control_graph.add_company(analysis.company)
+        return analysis.company
+
+    def get_api_filings_data(self, download_binary: bool = False, incremental: bool = False) -> None:
+        # incremental: the filing history is listed newest first, so paging stops at the first filing already in the
+        # store; the stored ones are completed with their stored document metadata (no Document calls, no downloads,
+        # so changes to stored filings or documents, i.e. another document etag, are only seen by a full run)
+        stored_items = company_store.get_filings(self.company.company_number, fresh=False) if incremental else None
+        stored_documents = company_store.get_documents(self.company.company_number) if stored_items else {}
+        known = {item.get('transaction_id') for item in stored_items or []}
+        pages = self.api_get_pages('filings')
+        api_data = next(pages)
         print(json.dumps(api_data, indent=4))
         # if not api_data['errors']:
 
-        # Filings
-        for item in api_data['items']:
-            filing = Filing()
-
-            try:
-                filing.transaction_id = item['transaction_id']
-            except (KeyError, TypeError) as e:
-                pass
-
-            try:
-                filing.category = item['category']
-            except (KeyError, TypeError) as e:
-                pass
-
-            try:
-                filing.filing_type = item['type']
-            except (KeyError, TypeError) as e:
-                pass
-
-            try:
-                filing.description = item['description']
-            except (KeyError, TypeError) as e:
-                pass
+        # optional download stage for document binaries, running alongside metadata parsing
+        if download_binary:
+            output_path = os.path.join('output/', self.company.company_number)
+            download_queue = DownloadQueue(self.download_document_content, workers=self.max_workers)
+        else:
+            download_queue = None
 
-            try:
-                filing.action_date = item['action_date']
-            except (KeyError, TypeError) as e:
-                pass
+        document_data = {}  # document ID -> API data, for the company store
 
-            try:
-                filing.date = item['date']
-            except (KeyError, TypeError) as e:
-                pass
+        def fetch_document(document: Document) -> None:
+            # API call to Document endpoint to retrieve extra information on this document
+            document_data[document.document_id] = self.api_get_request('document', document.document_id)
+            self.parse_api_document_data(document, document_data[document.document_id])
+            # optional API call to Document Content endpoint to retrieve binary for document
+            # (queued as soon as its size is known)
+            if download_queue:
+                download_queue.submit(document.document_id, document.pdf_content_length, document, output_path)
 
-            try:
-                filing.paper_filed = item['paper_filed']
-            except (KeyError, TypeError) as e:
-                pass
+        # API calls to Document endpoint are submitted as soon as a filing is parsed so they
+        # overlap with fetching the next pages of the filing history
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        documents = []
 
-            try:
-                filing.description_values = item['description_values']
-            except (KeyError, TypeError) as e:
-                pass
+        # Filings
+        items = []
+        for item in self.page_items(itertools.chain([api_data], pages)):
+            if item.get('transaction_id') in known:
+                break
+            items.append(item)
+            filing = self.parse_api_filing_item(item)
+            if filing.document:
+                documents.append(executor.submit(fetch_document, filing.document))
+            self.company.filings.append(filing)
 
-            try:
-                filing.resolutions = item['resolutions']
-            except (KeyError, TypeError) as e:
-                pass
+        # Wait for the extra information on each document, then for the queued downloads
+        try:
+            with executor:
+                for future in documents:
+                    future.result()
+        finally:
+            if download_queue:
+                download_queue.close()
+
+        if stored_items:
+            self.changes['filings'] = len(items)
+            for item in stored_items:
+                filing = self.parse_api_filing_item(item)
+                if filing.document and filing.document.document_id in stored_documents:
+                    self.parse_api_document_data(filing.document, stored_documents[filing.document.document_id])
+                self.company.filings.append(filing)
+            items += stored_items
+
+        if company_store and isinstance(api_data, dict) and 'errors' not in api_data:
+            company_store.put_company_items('filings', self.company.company_number, items)
+            company_store.put_documents(self.company.company_number, document_data)
+
+    @staticmethod
+    def parse_api_filing_item(item: dict) -> Filing:
+        # Filing (and its Document, metadata to be completed) from an item of the filing history
+        # (API pages and company store alike)
+        filing = filing_fields.parse(Filing, item)
+        # NOTE: some old documents don't have a document metadata
+        try:
+            if item['links']['document_metadata']:
+                filing.document = filing_document_fields.parse(Document, item)
+        except (KeyError, TypeError) as e:
+            pass
+        return filing
 
-            try:
-                filing.associated_filings = item['associated_filings']
-            except (KeyError, TypeError) as e:
-                pass
+    def download_document_content(self, document: Document, output_path: str) -> int:
+        # Streams the PDF binary of a document to <output_path>/<document_id>.pdf
+        # returns the number of bytes written, or None when the file was already downloaded (same size as advertised
+        # by the API)
+        file_path = os.path.join(output_path, document.document_id + ".pdf")
+        if document.pdf_content_length and os.path.exists(file_path) \
+                and os.path.getsize(file_path) == document.pdf_content_length:
+            return None
 
-            # Document
-            # NOTE: some old documents don't have a document metadata
-            try:
-                if item['links']['document_metadata']:
-                    document = Document()
-
-                    try:
-                        # extracting document Primary Key from URI
-                        document.document_id = item['links']['document_metadata'].split('/')[-1]
-                    except (KeyError, TypeError) as e:
-                        pass
-
-                    try:
-                        document.pages = item['pages']
-                    except (KeyError, TypeError) as e:
-                        pass
-
-                    try:
-                        document.barcode = item['barcode']
-                    except (KeyError, TypeError) as e:
-                        pass
-
-                    # API call to Document endpoint to retrieve extra information on this document
-                    document_api_data = self.api_get_request('document', document.document_id)
-
-                    try:
-                        document.category = document_api_data['category']
-                    except (KeyError, TypeError) as e:
-                        pass
-
-                    try:
-                        document.significant_date = document_api_data['significant_date']
-                    except (KeyError, TypeError) as e:
-                        pass
-
-                    try:
-                        document.significant_date_type = document_api_data['significant_date_type']
-                    except (KeyError, TypeError) as e:
-                        pass
-
-                    try:
-                        document.filename = document_api_data['filename']
-                    except (KeyError, TypeError) as e:
-                        pass
-
-                    try:
-                        document.created_at = document_api_data['created_at']
-                    except (KeyError, TypeError) as e:
-                        pass
-
-                    try:
-                        document.updated_at = document_api_data['updated_at']
-                    except (KeyError, TypeError) as e:
-                        pass
-
-                    try:
-                        document.etag = document_api_data['etag']
-                    except (KeyError, TypeError) as e:
-                        pass
-
-                    try:
-                        if document_api_data['resources']['application/pdf']:
-                            document.pdf = True
-                            document.pdf_content_length = document_api_data['resources']['application/pdf']['content_length']
-                    except (KeyError, TypeError) as e:
-                        pass
-
-                    try:
-                        if document_api_data['resources']['application/json']:
-                            document.json = True
-                            document.json_content_length = document_api_data['resources']['application/json']['content_length']
-                    except (KeyError, TypeError) as e:
-                        pass
-
-                    try:
-                        if document_api_data['resources']['application/xml']:
-                            document.xml = True
-                            document.xml_content_length = document_api_data['resources']['application/xml']['content_length']
-                    except (KeyError, TypeError) as e:
-                        pass
-
-                    try:
-                        if document_api_data['resources']['application/xhtml+xml']:
-                            document.xhtml = True
-                            document.xhtml_content_length = document_api_data['resources']['application/xhtml+xml']['content_length']
-                    except (KeyError, TypeError) as e:
-                        pass
-
-                    try:
-                        if document_api_data['resources']['text/csv']:
-                            document.csv = True
-                            document.csv_content_length = document_api_data['resources']['text/csv']['content_length']
-                    except (KeyError, TypeError) as e:
-                        pass
-
-                    # optional API call to Document Content endpoint to retrieve binary for document
-                    if download_binary:
-                        output_directory = self.company.company_number
-                        output_path = os.path.join('output/', output_directory)
-
-                        time.sleep(5)
-                        try:
-                            with open(output_path + "/" + document.document_id + ".pdf", "wb") as binary_file:
-                                pdf_document = self.api_get_request('document_content', document.document_id)
-                                binary_file.write(pdf_document)
-                                # document.binary = pdf_document
-                        except (KeyError, TypeError) as e:
-                            pass
-
-                filing.document = document
-
-            except KeyError as e:
-                pass
+        return self.session.download(self.api_url('document_content', document.document_id), file_path)
 
-            self.company.filings.append(filing)
+    def parse_api_document_data(self, document: Document, document_api_data: dict) -> None:
+        document_fields.apply(document, document_api_data)
 
     # Scoring Method
     def score(self) -> None:
         # wrapper method that call the score methods in the correct order
         # and return the final score + percentile
 
-        output_directory = self.company.company_number
-        output_path = os.path.join('output/', output_directory)
+        # 0. News lookups for all individuals, run concurrently up front
+        # (officers and PSCs unchanged since the last analysis keep their previous score, see get_api_data)
+        self.company.prefetch_news(self.reused)
 
         # 1. Officers
-        print("Officers weighted-average score: " + str(round(self.company.officers_weighted_score(), 2)))
+        print("Officers weighted-average score: " + str(round(self.company.officers_weighted_score(self.reused), 2)))
 
         # 2. PSCs
-        print("PSCs weighted-average score: " + str(round(self.company.pscs_weighted_score(), 2)))
+        print("PSCs weighted-average score: " + str(round(self.company.pscs_weighted_score(self.reused), 2)))
+        owners = self.company.ultimate_beneficial_owners()
+        owner_names = owners['individuals'] + ["unknown owners of " + key for key in owners['unresolved']]
+        if owner_names:
+            print("Ultimate beneficial owners: " + ", ".join(owner_names))
 
         # 3. Addresses
+        office = self.company.registered_office
+        if office and address_index:
+            counts = address_index.counts(office.postal_code, office.address_line_1)
+            if counts and counts['companies'] > 1:
+                print("Registered office shared by %d companies seen (%d dissolved, %d short-lived, %d high-risk)" % (
+                    counts['companies'], counts['dissolved'], counts['short_lived'], counts['high_risk']))
+            if office.has_high_proportion_short_lived_companies():
+                print("- Red flag: high proportion of short-lived companies at the registered office")
+            if office.has_high_proportion_of_dissolved_companies():
+                print("- Red flag: high proportion of dissolved companies at the registered office")
+            if office.has_high_proportion_of_fraudulent_businesses():
+                print("- Red flag: high proportion of high-risk companies at the registered office")
 
         # 4. Filings
 
@@ -1148,12 +1503,40 @@ class Analysis:
 
         # 6. Final Score
         print("Final weighted-average score: " + str(round(self.company.final_score(), 2)))
+        self.index_address()
 
         # 7. Percentiles
+        percentile = self.rank()
+        if percentile is not None:
+            print("Percentile among %d companies analysed: %s" % (len(score_distribution), round(percentile, 1)))
 
         # Store resulting aggregated JSON in local folder
+        self.save_scores()
+
+    def index_address(self) -> None:
+        # records the company (status, dates and latest final score) under its registered office address
+        if address_index:
+            address_index.add(self.company)
+
+    def rank(self) -> float:
+        # adds the final score to the distribution of all companies analysed and returns its percentile
+        final_score = self.company.summary_score.get('final_company_score')
+        if score_distribution is None or final_score is None:
+            return None
+        score_distribution.add(self.company.company_number, final_score)
+        percentile = score_distribution.percentile(final_score)
+        self.company.summary_score['percentile'] = percentile
+        return percentile
+
+    def save_scores(self) -> None:
+        output_path = os.path.join('output/', self.company.company_number)
+        os.makedirs(output_path, exist_ok=True)
         with open(output_path + "/scores.json", "w") as outfile:
             outfile.write(json.dumps(self.company.summary_score, indent=4))
+        if company_store:
+            company_store.put_scores(self.company.company_number, self.company.summary_score)
+            # snapshot with the scores of the officers and PSCs, for the next incremental analysis
+            company_store.put_analysis(self.company.company_number, self.company.to_json())
 
     # Optional HTML reporting
     def report(self):
@@ -0,0 +1,77 @@
+import json
+import os
+import re
+import threading
+import time
+
+
+class NewsCache:
+    # Persistent memo of news lookups keyed by the normalised query and the search period,
+    # so the same individual is only searched once per TTL across companies and runs.
+    # Stored as an append-only JSON-lines file, loaded once and compacted when mostly stale.
+    def __init__(self, path: str, ttl: float = 7 * 24 * 3600, period: str = '10y'):
+        self.path = path
+        self.ttl = ttl
+        self.period = period  # time window searched (GoogleNews period)
+        self.entries = {}
+        self.lock = threading.Lock()
+        # Stats
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        line_count = 0
+        if os.path.exists(path):
+            with open(path) as fp:
+                for line in fp:
+                    line_count += 1
+                    try:
+                        entry = json.loads(line)
+                    except ValueError as e:
+                        continue
+                    if not self.is_expired(entry):
+                        self.entries[entry['key']] = entry
+        if line_count > 2 * len(self.entries) + 100:
+            self.compact()
+
+    @staticmethod
+    def normalise(query: str) -> str:
+        # searches are case-insensitive and whitespace-insensitive
+        return re.sub(r'\s+', ' ', query).strip().casefold()
+
+    def key(self, query: str) -> str:
+        return self.period + '|' + self.normalise(query)
+
+    def is_expired(self, entry: dict) -> bool:
+        return time.time() - entry['stored_at'] > self.ttl
+
+    def get(self, query: str, record: bool = True):
+        # list of story titles, or None when the query hasn't been searched recently
+        with self.lock:
+            entry = self.entries.get(self.key(query))
+            if entry is None or self.is_expired(entry):
+                if record:
+                    self.misses += 1
+                return None
+            if record:
+                self.hits += 1
+            return entry['news']
+
+    def put(self, query: str, news: list) -> None:
+        entry = {'key': self.key(query), 'stored_at': time.time(), 'news': news}
+        with self.lock:
+            self.entries[entry['key']] = entry
+            with open(self.path, 'a') as fp:
+                fp.write(json.dumps(entry) + "\n")
+
+    def compact(self) -> None:
+        # rewrite the file with the live entries only
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as fp:
+            for entry in self.entries.values():
+                fp.write(json.dumps(entry) + "\n")
+        os.replace(temp_path, self.path)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries)}
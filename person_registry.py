@@ -0,0 +1,103 @@
+import threading
+
+from reference_data import normalise_name
+
+
+class PersonRegistry:
+    # Identity layer for officers and PSCs seen across companies: each individual resolves to a
+    # canonical key under which their score components are memoized, so someone sitting on many
+    # boards is only evaluated once per process (batch runs included)
+    def __init__(self):
+        self.entries = {}  # canonical key -> {'records': {record id: etag}, 'components': {...}}
+        self.aliases = {}  # name + date of birth key -> officer key (so PSCs resolve to the same person)
+        self.lock = threading.RLock()
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def name_key(person) -> str:
+        # fallback identity: normalised name + month / year of birth (None if too ambiguous)
+        name = person.name
+        if not name and person.forename and person.surname:
+            name = person.forename + " " + person.surname
+        if not name or not person.dob_year:
+            return None
+        return "name:%s|%s-%s" % (normalise_name(name), person.dob_year, person.dob_month)
+
+    def resolve(self, person) -> str:
+        # canonical key of the individual: the officer ID shared by all their appointments,
+        # else their name and date of birth (resolved once per scoring, then passed to get / put)
+        name_key = self.name_key(person)
+        appointment = getattr(person, 'appointment', None)
+        with self.lock:
+            if appointment:
+                key = "officer:" + appointment
+                if name_key:
+                    self.aliases[name_key] = key
+            elif name_key:
+                key = self.aliases.get(name_key, name_key)
+            else:
+                return None
+
+            # invalidate the memo when a record already seen comes back with a different etag
+            entry = self.entries.get(key)
+            if entry and person.id and person.etag:
+                previous_etag = entry['records'].get(person.id)
+                if previous_etag is not None and previous_etag != person.etag:
+                    self.entries.pop(key)
+                    self.invalidations += 1
+                    entry = None
+            if entry is None:
+                entry = self.entries[key] = {'records': {}, 'components': {}}
+            if person.id:
+                entry['records'][person.id] = person.etag
+        return key
+
+    @staticmethod
+    def component(flag: str, *args) -> str:
+        # memo key of a flag method called with these arguments
+        return flag + "|" + "|".join(str(arg) for arg in args)
+
+    def get(self, key: str, component: str):
+        # (result, red flags) memoized for the individual resolved to this key, or None
+        with self.lock:
+            cached = self.entries[key]['components'].get(component) if key else None
+            if cached is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return cached
+
+    def put(self, key: str, component: str, result, red_flags: list) -> None:
+        if key:
+            with self.lock:
+                self.entries[key]['components'][component] = (result, list(red_flags))
+
+    def get_many(self, key: str, components: list) -> list:
+        # get() for several components of the same individual in one call (None for each one not memoized)
+        with self.lock:
+            memo = self.entries[key]['components'] if key else {}
+            cached = [memo.get(component) for component in components]
+            misses = cached.count(None)
+            self.hits += len(cached) - misses
+            self.misses += misses
+            return cached
+
+    def put_many(self, key: str, results: dict) -> None:
+        # put() for several components of the same individual: component -> (result, red flags)
+        if key:
+            with self.lock:
+                memo = self.entries[key]['components']
+                for component, (result, red_flags) in results.items():
+                    memo[component] = (result, list(red_flags))
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'persons': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+            }
@@ -0,0 +1,77 @@
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import threading
+import time
+
+
+class RateLimiter:
+    # Process-wide sliding-window limiter: at most max_calls calls in any period (seconds).
+    # Unlike a token bucket it cannot burst over the quota at window boundaries, so
+    # Companies House's 600 requests / 5 minutes limit is guaranteed on our side.
+    def __init__(self, max_calls: int, period: float):
+        self.max_calls = max_calls
+        self.period = period
+        self.calls = deque()  # monotonic timestamps of the calls in the current window
+        self.paused_until = 0.0  # set when the server tells us to back off (429)
+        self.lock = threading.Lock()
+        # Stats
+        self.call_count = 0
+        self.throttled_count = 0
+        self.waited_seconds = 0.0
+
+    def acquire(self) -> None:
+        # block until a call is allowed, then record it
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                wait = self.paused_until - now
+                if wait <= 0:
+                    while self.calls and now - self.calls[0] >= self.period:
+                        self.calls.popleft()
+                    if len(self.calls) < self.max_calls:
+                        self.calls.append(now)
+                        self.call_count += 1
+                        return
+                    wait = self.period - (now - self.calls[0])
+                self.waited_seconds += wait
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        # stop every caller sharing this limiter for the given number of seconds
+        with self.lock:
+            self.throttled_count += 1
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'calls': self.call_count,
+                'throttled': self.throttled_count,
+                'waited_seconds': round(self.waited_seconds, 3),
+                'max_calls': self.max_calls,
+                'period': self.period,
+            }
+
+
+def retry_after_seconds(headers, default: float) -> float:
+    # Retry-After is either a number of seconds or an HTTP date
+    retry_after = headers.get('Retry-After')
+    if retry_after:
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            pass
+        try:
+            retry_date = parsedate_to_datetime(retry_after)
+            return max((retry_date - datetime.now(timezone.utc)).total_seconds(), 0.0)
+        except (TypeError, ValueError):
+            pass
+    # Companies House also sends the epoch at which the current window resets
+    reset = headers.get('X-Ratelimit-Reset')
+    if reset:
+        try:
+            return max(float(reset) - time.time(), 0.0)
+        except ValueError:
+            pass
+    return default
@@ -0,0 +1,89 @@
+import json
+import re
+import unicodedata
+
+titles = {'mr', 'mrs', 'ms', 'miss', 'mx', 'dr', 'prof', 'sir', 'dame', 'lord', 'lady', 'rev'}
+
+
+def strip_accents(value: str) -> str:
+    if value.isascii():
+        # nothing to decompose (most names and countries)
+        return value
+    value = unicodedata.normalize('NFKD', value)
+    return ''.join(character for character in value if not unicodedata.combining(character))
+
+
+def normalise(value: str) -> str:
+    # 'Curaçao' -> 'curacao', 'St. Kitts & Nevis' -> 'st kitts and nevis'
+    value = strip_accents(value).casefold().replace('&', ' and ')
+    return ' '.join(re.split(r'[^\w]+', value)).strip()
+
+
+def normalise_name(name: str) -> str:
+    # 'MANDERS, Chase James' and 'Mr Chase James Manders' -> 'chase james manders'
+    # (accents, punctuation, titles and word order are ignored)
+    tokens = [token for token in normalise(name).split(' ') if token and token not in titles]
+    return ' '.join(sorted(tokens))
+
+
+class ReferenceIndex:
+    # Reference list compiled once into a hash index of normalised values (aliases such as
+    # demonyms included). Token prefixes of a value are probed in the same index, so
+    # 'Cyprus, Republic of' or 'Jersey (Channel Islands)' still match 'Cyprus' and 'Jersey'
+    # with a handful of O(1) lookups whatever the size of the list
+    def __init__(self, values: list, aliases: dict = None, normaliser=normalise):
+        self.normaliser = normaliser
+        self.entries = {}  # normalised value -> canonical entry
+        for value in values:
+            self.entries[normaliser(value)] = value
+        for alias, value in (aliases or {}).items():
+            key = normaliser(value)
+            # aliases only count when they point to an entry of this list
+            if key in self.entries:
+                self.entries.setdefault(normaliser(alias), self.entries[key])
+
+        # number of tokens of the longest entry: bounds the prefixes probed
+        self.max_tokens = max((key.count(' ') + 1 for key in self.entries), default=0)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, value) -> bool:
+        return self.match(value, prefix=False) is not None
+
+    def match(self, value: str, prefix: bool = True) -> str:
+        # canonical entry matching the value, or None
+        if not value:
+            return None
+        key = self.normaliser(value)
+        entry = self.entries.get(key)
+        if entry is not None or not prefix or not key:
+            return entry
+
+        # longest token prefix first
+        tokens = key.split(' ')
+        for length in range(min(len(tokens) - 1, self.max_tokens), 0, -1):
+            entry = self.entries.get(' '.join(tokens[:length]))
+            if entry is not None:
+                return entry
+        return None
+
+    def match_any(self, value: str, separators: str = r'[,/;]| and ') -> str:
+        # for multi-valued fields such as dual nationalities ('British,Irish')
+        entry = self.match(value)
+        if entry is not None or not value:
+            return entry
+        for part in re.split(separators, value):
+            entry = self.match(part.strip())
+            if entry is not None:
+                return entry
+        return None
+
+
+def load_country_names(path: str = 'datasets/country_names.json') -> dict:
+    # demonyms and alternative names -> country names
+    with open(path) as fp:
+        country_names = json.load(fp)
+    aliases = dict(country_names['aliases'])
+    aliases.update(country_names['demonyms'])
+    return aliases
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlencode
+
+
+class ResponseCache:
+    # Persistent cache of JSON API responses keyed by URL (+ query parameters).
+    # Entries keep the ETag they were served with so they can be revalidated with
+    # If-None-Match: an unchanged resource then costs a bodiless 304 instead of a full download.
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024, max_age: float = 30 * 24 * 3600,
+                 fresh_for: float = 0):
+        self.directory = directory
+        self.max_bytes = max_bytes  # size-based eviction (least recently used first)
+        self.max_age = max_age  # age-based eviction in seconds
+        self.fresh_for = fresh_for  # entries younger than this (seconds) are served without revalidation
+        os.makedirs(self.directory, exist_ok=True)
+        self.lock = threading.Lock()
+        # Stats
+        self.hits = 0  # fresh or revalidated (304) - body served from disk
+        self.misses = 0  # no usable entry
+        self.updates = 0  # entry existed but the resource changed
+        self.evictions = 0
+        # Current size of the cache on disk (scanned once, then maintained incrementally)
+        self.sizes = {}
+        for filename in os.listdir(self.directory):
+            if filename.endswith('.json'):
+                self.sizes[filename] = os.path.getsize(os.path.join(self.directory, filename))
+        self.total_bytes = sum(self.sizes.values())
+
+    @staticmethod
+    def key(url: str, params: dict = None) -> str:
+        if params:
+            url += '?' + urlencode(sorted(params.items()))
+        return hashlib.sha1(url.encode()).hexdigest() + '.json'
+
+    def get(self, url: str, params: dict = None) -> dict:
+        # returns {'url', 'etag', 'stored_at', 'body'} or None (stored_at: last download or revalidation)
+        filename = self.key(url, params)
+        path = os.path.join(self.directory, filename)
+        try:
+            with open(path) as fp:
+                entry = json.load(fp)
+        except (OSError, ValueError) as e:
+            return None
+
+        if time.time() - entry['stored_at'] > self.max_age:
+            self.remove(filename)
+            return None
+        return entry
+
+    def is_fresh(self, entry: dict) -> bool:
+        return time.time() - entry['stored_at'] < self.fresh_for
+
+    def put(self, url: str, params: dict, etag: str, body) -> None:
+        filename = self.key(url, params)
+        path = os.path.join(self.directory, filename)
+        data = json.dumps({'url': url, 'params': params, 'etag': etag, 'stored_at': time.time(), 'body': body})
+        # atomic write so concurrent readers never see a partial entry
+        temp_path = path + '.%d.tmp' % threading.get_ident()
+        with open(temp_path, 'w') as fp:
+            fp.write(data)
+        os.replace(temp_path, path)
+
+        with self.lock:
+            self.total_bytes += len(data) - self.sizes.get(filename, 0)
+            self.sizes[filename] = len(data)
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    def touch(self, url: str, params: dict, entry: dict) -> None:
+        # the entry was revalidated (304): stored again with the current time, so its freshness and age count from
+        # the last revalidation rather than the first download (and it moves to the end of the LRU order)
+        self.put(url, params, entry['etag'], entry['body'])
+
+    def remove(self, filename: str) -> None:
+        try:
+            os.remove(os.path.join(self.directory, filename))
+        except OSError as e:
+            pass
+        with self.lock:
+            self.total_bytes -= self.sizes.pop(filename, 0)
+            self.evictions += 1
+
+    def evict(self) -> None:
+        # called with the lock held: drop least recently used entries down to 90% of max_bytes
+        def mtime(filename):
+            try:
+                return os.path.getmtime(os.path.join(self.directory, filename))
+            except OSError as e:
+                return 0.0
+
+        for filename in sorted(self.sizes, key=mtime):
+            if self.total_bytes <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(os.path.join(self.directory, filename))
+            except OSError as e:
+                pass
+            self.total_bytes -= self.sizes.pop(filename)
+            self.evictions += 1
+
+    def record(self, outcome: str) -> None:
+        with self.lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses + self.updates
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'updates': self.updates,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'entries': len(self.sizes),
+                'bytes': self.total_bytes,
+            }
+
+    def __str__(self) -> str:
+        stats = self.stats()
+        return "%d hits, %d misses, %d updates (%d entries, %.1f MB)" % (
+            stats['hits'], stats['misses'], stats['updates'], stats['entries'], stats['bytes'] / 1024 / 1024)
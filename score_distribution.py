@@ -0,0 +1,107 @@
+import bisect
+import glob
+import json
+import os
+import threading
+
+
+class ScoreDistribution:
+    # Distribution of the final scores of every company analysed, used to turn a raw score into a
+    # percentile. Kept in memory as a sorted list (O(log n) ranking with bisect) and persisted as an
+    # append-only JSON-lines file, so a new score never requires rescanning past analyses.
+    # Only the latest score of each company counts; the file is compacted when mostly superseded.
+    # The file is only read (or created) on first use.
+    def __init__(self, path: str, scores_directory: str = 'output'):
+        self.path = path
+        self.scores_directory = scores_directory
+        self.latest = {}  # company number -> score
+        self.scores = []  # sorted scores
+        self.lock = threading.Lock()
+        self.loaded = False
+
+    def load(self) -> None:
+        # reads the file, or seeds it on the first run (caller holds the lock)
+        if self.loaded:
+            return
+        self.loaded = True
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        line_count = 0
+        seeded = False
+        if os.path.exists(self.path):
+            with open(self.path) as fp:
+                for line in fp:
+                    line_count += 1
+                    try:
+                        entry = json.loads(line)
+                    except ValueError as e:
+                        # last line can be truncated after a crash
+                        continue
+                    self.latest[entry['company_number']] = entry['score']
+        elif self.scores_directory:
+            # first run: seed with the analyses already in the output folder
+            self.latest = self.read_scores(self.scores_directory)
+            seeded = True
+        self.scores = sorted(self.latest.values())
+        if seeded or line_count > 2 * len(self.latest) + 100:
+            self.compact()
+
+    @staticmethod
+    def read_scores(scores_directory: str) -> dict:
+        # final scores of the <scores_directory>/<company number>/scores.json files
+        scores = {}
+        for scores_path in glob.glob(os.path.join(scores_directory, '*', 'scores.json')):
+            try:
+                with open(scores_path) as fp:
+                    score = json.load(fp).get('final_company_score')
+            except (OSError, ValueError) as e:
+                continue
+            if score is not None:
+                scores[os.path.basename(os.path.dirname(scores_path))] = score
+        return scores
+
+    def __len__(self) -> int:
+        with self.lock:
+            self.load()
+            return len(self.scores)
+
+    def add(self, company_number: str, score: float) -> None:
+        with self.lock:
+            self.load()
+            previous = self.latest.get(company_number)
+            if previous == score:
+                return
+            if previous is not None:
+                # re-analysis: the previous score of the company is replaced
+                del self.scores[bisect.bisect_left(self.scores, previous)]
+            bisect.insort(self.scores, score)
+            self.latest[company_number] = score
+            with open(self.path, 'a') as fp:
+                fp.write(json.dumps({'company_number': company_number, 'score': score}) + "\n")
+
+    def percentile(self, score: float) -> float:
+        # share of companies scoring lower (ties count for half), from 0 to 100
+        with self.lock:
+            self.load()
+            if not self.scores:
+                return None
+            lower = bisect.bisect_left(self.scores, score)
+            ties = bisect.bisect_right(self.scores, score) - lower
+            return 100 * (lower + ties / 2) / len(self.scores)
+
+    def compact(self) -> None:
+        # rewrite the file with the latest score of each company only
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as fp:
+            for company_number, score in self.latest.items():
+                fp.write(json.dumps({'company_number': company_number, 'score': score}) + "\n")
+        os.replace(temp_path, self.path)
+
+    def stats(self) -> dict:
+        with self.lock:
+            self.load()
+            return {
+                'companies': len(self.scores),
+                'min': self.scores[0] if self.scores else None,
+                'median': self.scores[len(self.scores) // 2] if self.scores else None,
+                'max': self.scores[-1] if self.scores else None,
+            }
@@ -0,0 +1,518 @@
+import argparse
+import csv
+from datetime import datetime
+import io
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zipfile
+
+# Local store of everything fetched about companies: profiles and PSCs (also filled from the Companies House
+# bulk snapshots, http://download.companieshouse.gov.uk/en_output.html and en_pscdata.html), officers, filings,
+# documents, and the aggregated data and scores of each analysis. Analyses only call the API for the companies
+# missing from (or stale in) the store, and portfolio-wide queries or re-scoring run off this single file.
+# API data is kept in its JSON shape so the Analysis parsers read it unchanged.
+
+schema = """
+CREATE TABLE IF NOT EXISTS companies (
+    company_number TEXT PRIMARY KEY,
+    company_name TEXT,
+    company_status TEXT,
+    postal_code TEXT,       -- normalised ('SW1Y4QU')
+    etag TEXT,
+    source TEXT,            -- 'bulk' or 'api'
+    updated_at REAL,
+    pscs_updated_at REAL,   -- when the PSCs of the company were last loaded (NULL if never), same for officers and filings
+    officers_updated_at REAL,
+    filings_updated_at REAL,
+    profile TEXT,           -- company profile (API JSON shape)
+    analysis TEXT,          -- aggregated data of the last analysis (Company.to_json)
+    scores TEXT,            -- summary scores of the last analysis
+    final_score REAL,
+    analysed_at REAL
+);
+CREATE INDEX IF NOT EXISTS companies_postal_code ON companies (postal_code);
+CREATE INDEX IF NOT EXISTS companies_final_score ON companies (final_score);
+
+CREATE TABLE IF NOT EXISTS sic_codes (
+    company_number TEXT NOT NULL,
+    sic_code TEXT NOT NULL,
+    PRIMARY KEY (company_number, sic_code)
+);
+CREATE INDEX IF NOT EXISTS sic_codes_sic_code ON sic_codes (sic_code);
+
+CREATE TABLE IF NOT EXISTS pscs (
+    company_number TEXT NOT NULL,
+    psc_id TEXT NOT NULL,
+    kind TEXT,
+    name TEXT,
+    etag TEXT,
+    data TEXT,              -- PSC item (API JSON shape)
+    PRIMARY KEY (company_number, psc_id)
+);
+
+CREATE TABLE IF NOT EXISTS officers (
+    company_number TEXT NOT NULL,
+    officer_id TEXT NOT NULL,
+    person_id TEXT,         -- officer ID of the appointments link, shared by all the appointments of a person
+    name TEXT,
+    officer_role TEXT,
+    etag TEXT,
+    data TEXT,              -- officer item (API JSON shape)
+    PRIMARY KEY (company_number, officer_id)
+);
+CREATE INDEX IF NOT EXISTS officers_person_id ON officers (person_id);
+
+CREATE TABLE IF NOT EXISTS filings (
+    company_number TEXT NOT NULL,
+    transaction_id TEXT NOT NULL,
+    category TEXT,
+    type TEXT,
+    date TEXT,
+    data TEXT,              -- filing history item (API JSON shape)
+    PRIMARY KEY (company_number, transaction_id)
+);
+
+CREATE TABLE IF NOT EXISTS documents (
+    document_id TEXT PRIMARY KEY,
+    company_number TEXT,
+    etag TEXT,
+    data TEXT               -- document metadata (API JSON shape)
+);
+CREATE INDEX IF NOT EXISTS documents_company_number ON documents (company_number);
+"""
+
+# columns added to the companies table since the first version of the store
+added_columns = {
+    'officers_updated_at': 'REAL',
+    'filings_updated_at': 'REAL',
+    'analysis': 'TEXT',
+    'scores': 'TEXT',
+    'final_score': 'REAL',
+    'analysed_at': 'REAL',
+}
+
+# bulk CSV company categories -> API company types
+company_types = {
+    'private limited company': 'ltd',
+    'public limited company': 'plc',
+    'private unlimited company': 'private-unlimited',
+    'private unlimited': 'private-unlimited',
+    "pri/ltd by guar/nsc (private, limited by guarantee, no share capital)": 'private-limited-guarant-nsc',
+    "pri/lbg/nsc (private, limited by guarantee, no share capital, use of 'limited' exemption)": 'private-limited-guarant-nsc-limited-exemption',
+    'limited liability partnership': 'llp',
+    'limited partnership': 'limited-partnership',
+    'scottish partnership': 'scottish-partnership',
+    'community interest company': 'community-interest-company',
+    'charitable incorporated organisation': 'charitable-incorporated-organisation',
+    'scottish charitable incorporated organisation': 'scottish-charitable-incorporated-organisation',
+    'overseas entity': 'registered-overseas-entity',
+    'other company type': 'other',
+}
+
+
+def bulk_date(value: str) -> str:
+    # '25/12/2017' -> '2017-12-25'
+    try:
+        return datetime.strptime(value.strip(), '%d/%m/%Y').date().isoformat()
+    except (AttributeError, ValueError) as e:
+        return None
+
+
+def profile_from_csv_row(row: dict) -> dict:
+    # company profile (API shape) from a row of the bulk company data CSV
+    sic_codes = []
+    for i in range(1, 5):
+        sic_text = (row.get('SICCode.SicText_%d' % i) or '').strip()
+        sic_code = sic_text.split(' - ')[0].strip()
+        if sic_code.isdigit():
+            sic_codes.append(sic_code)
+
+    category = (row.get('CompanyCategory') or '').strip()
+    status = (row.get('CompanyStatus') or '').strip()
+    profile = {
+        'company_number': row['CompanyNumber'].strip(),
+        'company_name': row.get('CompanyName', '').strip() or None,
+        'type': company_types.get(category.lower(), category.lower().replace(' ', '-') or None),
+        # 'Active - Proposal to Strike off' -> 'active'
+        'company_status': status.split(' - ')[0].strip().lower().replace(' ', '-') or None,
+        'date_of_creation': bulk_date(row.get('IncorporationDate')),
+        'date_of_cessation': bulk_date(row.get('DissolutionDate')),
+        'sic_codes': sic_codes,
+        'registered_office_address': {
+            'care_of': row.get('RegAddress.CareOf', '').strip() or None,
+            'po_box': row.get('RegAddress.POBox', '').strip() or None,
+            'address_line_1': row.get('RegAddress.AddressLine1', '').strip() or None,
+            'address_line_2': row.get('RegAddress.AddressLine2', '').strip() or None,
+            'locality': row.get('RegAddress.PostTown', '').strip() or None,
+            'region': row.get('RegAddress.County', '').strip() or None,
+            'country': row.get('RegAddress.Country', '').strip() or None,
+            'postal_code': row.get('RegAddress.PostCode', '').strip() or None,
+        },
+        'accounts': {
+            'next_due': bulk_date(row.get('Accounts.NextDueDate')),
+            'last_accounts': {
+                'made_up_to': bulk_date(row.get('Accounts.LastMadeUpDate')),
+                'type': (row.get('Accounts.AccountCategory') or '').strip().lower().replace(' ', '-') or None,
+            },
+        },
+        'confirmation_statement': {
+            'next_due': bulk_date(row.get('ConfStmtNextDueDate')),
+            'last_made_up_to': bulk_date(row.get('ConfStmtLastMadeUpDate')),
+        },
+    }
+    for section in ('registered_office_address', 'accounts', 'confirmation_statement'):
+        profile[section] = {key: value for key, value in profile[section].items() if value is not None}
+    return profile
+
+
+def open_text(path: str):
+    # text stream of a snapshot file, zipped (as published) or not
+    if zipfile.is_zipfile(path):
+        archive = zipfile.ZipFile(path)
+        return io.TextIOWrapper(archive.open(archive.namelist()[0]), encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def normalise_postal_code(postal_code: str) -> str:
+    # 'sw1y 4qu' -> 'SW1Y4QU'
+    return re.sub(r'\s+', '', postal_code).upper() if postal_code else None
+
+
+def link_id(item: dict, *keys, position: int = -1) -> str:
+    # ID at the end of a link of an API item (e.g. link_id(item, 'links', 'self'))
+    try:
+        for key in keys:
+            item = item[key]
+        return item.split('/')[position]
+    except (KeyError, TypeError, AttributeError) as e:
+        return None
+
+
+class CompanyStore:
+    def __init__(self, path: str, max_age: float = 30 * 24 * 3600):
+        self.path = path
+        self.max_age = max_age  # seconds after which stored data is fetched from the API again
+        self.lock = threading.Lock()
+        # one connection shared by the analysis threads (sqlite3 objects aren't thread-safe on their own),
+        # opened on first use
+        self.opened_connection = None
+        self.open_lock = threading.Lock()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self.opened_connection is None:
+            with self.open_lock:
+                if self.opened_connection is None:
+                    self.opened_connection = self.open()
+        return self.opened_connection
+
+    def open(self) -> sqlite3.Connection:
+        # creates (or migrates) the database
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        self.migrate(connection)
+        connection.executescript(schema)
+        return connection
+
+    @staticmethod
+    def migrate(connection: sqlite3.Connection) -> None:
+        # adds the columns missing from a store created by an earlier version
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(companies)")}
+        if not columns:
+            return
+        with connection:
+            for name, column_type in added_columns.items():
+                if name not in columns:
+                    connection.execute("ALTER TABLE companies ADD COLUMN %s %s" % (name, column_type))
+
+    def is_fresh(self, updated_at) -> bool:
+        return updated_at is not None and time.time() - updated_at <= self.max_age
+
+    # Bulk ingestion
+    def ingest_companies_csv(self, path: str, batch_size: int = 10000) -> int:
+        # streams the bulk company data CSV (BasicCompanyDataAsOneFile-<date>.zip) into the store
+        count = 0
+        with open_text(path) as fp:
+            reader = csv.reader(fp)
+            # some headers come with a leading space (' CompanyNumber')
+            header = [name.strip() for name in next(reader)]
+            batch = []
+            for values in reader:
+                profile = profile_from_csv_row(dict(zip(header, values)))
+                batch.append(profile)
+                if len(batch) >= batch_size:
+                    count += self.put_companies(batch, source='bulk')
+                    batch = []
+            count += self.put_companies(batch, source='bulk')
+        return count
+
+    def ingest_pscs_jsonl(self, path: str, batch_size: int = 10000) -> int:
+        # streams the PSC snapshot (persons-with-significant-control-snapshot-<date>.zip): one JSON object
+        # per line, {"company_number": ..., "data": <PSC item>}, statements and totals lines are skipped
+        count = 0
+        with open_text(path) as fp:
+            batch = []
+            for line in fp:
+                try:
+                    entry = json.loads(line)
+                except ValueError as e:
+                    continue
+                item = entry.get('data') or {}
+                kind = item.get('kind') or ''
+                if not entry.get('company_number') or 'statement' in kind or kind.startswith('totals#'):
+                    continue
+                if 'natures_of_control' in item:
+                    item['nature_of_control'] = item.pop('natures_of_control')
+                batch.append((entry['company_number'], item))
+                if len(batch) >= batch_size:
+                    count += self.put_pscs(batch)
+                    batch = []
+            count += self.put_pscs(batch)
+        return count
+
+    # Writes
+    def put_companies(self, profiles: list, source: str = 'api') -> int:
+        # upserts company profiles (rows whose etag is unchanged are left as they are)
+        now = time.time()
+        rows = [(
+            profile['company_number'],
+            profile.get('company_name'),
+            profile.get('company_status'),
+            normalise_postal_code((profile.get('registered_office_address') or {}).get('postal_code')),
+            profile.get('etag'),
+            source,
+            now,
+            json.dumps(profile),
+        ) for profile in profiles]
+        sic_codes = [(profile['company_number'], sic_code) for profile in profiles for sic_code in profile.get('sic_codes') or []]
+        with self.lock, self.connection:
+            self.connection.executemany("""
+                INSERT INTO companies (company_number, company_name, company_status, postal_code, etag, source, updated_at, profile)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (company_number) DO UPDATE SET
+                    company_name = excluded.company_name, company_status = excluded.company_status,
+                    postal_code = excluded.postal_code, etag = excluded.etag, source = excluded.source,
+                    updated_at = excluded.updated_at, profile = excluded.profile
+                WHERE excluded.etag IS NULL OR excluded.etag IS NOT companies.etag OR companies.profile IS NULL
+            """, rows)
+            # unchanged rows are still up to date
+            self.connection.executemany(
+                "UPDATE companies SET updated_at = ? WHERE company_number = ? AND etag IS ?",
+                [(now, row[0], row[4]) for row in rows if row[4] is not None])
+            self.connection.executemany("DELETE FROM sic_codes WHERE company_number = ?", [(row[0],) for row in rows])
+            self.connection.executemany("INSERT OR IGNORE INTO sic_codes (company_number, sic_code) VALUES (?, ?)", sic_codes)
+        return len(rows)
+
+    def put_items(self, table: str, columns: tuple, rows: list, replace: bool = False) -> int:
+        # upserts the items of a company table (rows start with the company number, then the item key; an item
+        # is only rewritten if its etag, or its data for tables without etags, changed); replace drops the
+        # items previously stored for those companies first (a full list from the API)
+        now = time.time()
+        company_numbers = sorted({row[0] for row in rows})
+        changed = "excluded.etag IS NULL OR excluded.etag IS NOT %s.etag" % table if 'etag' in columns \
+            else "excluded.data IS NOT %s.data" % table
+        with self.lock, self.connection:
+            if replace:
+                self.connection.executemany("DELETE FROM %s WHERE company_number = ?" % table, [(number,) for number in company_numbers])
+            self.connection.executemany("""
+                INSERT INTO {table} ({columns}) VALUES ({values})
+                ON CONFLICT ({key}) DO UPDATE SET {updates} WHERE {changed}
+            """.format(table=table, columns=', '.join(columns), values=', '.join('?' * len(columns)),
+                       key=', '.join(columns[:2]), updates=', '.join('%s = excluded.%s' % (column, column) for column in columns[2:]),
+                       changed=changed), rows)
+            self.mark_loaded(table, company_numbers, now)
+        return len(rows)
+
+    def mark_loaded(self, table: str, company_numbers: list, now: float) -> None:
+        # caller holds the lock and the transaction
+        self.connection.executemany("""
+            INSERT INTO companies (company_number, {column}) VALUES (?, ?)
+            ON CONFLICT (company_number) DO UPDATE SET {column} = excluded.{column}
+        """.format(column=table + '_updated_at'), [(number, now) for number in company_numbers])
+
+    def put_pscs(self, items: list, replace: bool = False) -> int:
+        # upserts (company number, PSC item) pairs
+        rows = [(
+            company_number,
+            link_id(item, 'links', 'self') or item.get('etag') or item.get('name'),
+            item.get('kind'),
+            item.get('name'),
+            item.get('etag'),
+            json.dumps(item),
+        ) for company_number, item in items]
+        return self.put_items('pscs', ('company_number', 'psc_id', 'kind', 'name', 'etag', 'data'), rows, replace)
+
+    def put_officers(self, items: list, replace: bool = False) -> int:
+        # upserts (company number, officer item) pairs
+        rows = [(
+            company_number,
+            link_id(item, 'links', 'self') or item.get('etag') or item.get('name'),
+            link_id(item, 'links', 'officer', 'appointments', position=-2),
+            item.get('name'),
+            item.get('officer_role'),
+            item.get('etag'),
+            json.dumps(item),
+        ) for company_number, item in items]
+        return self.put_items('officers', ('company_number', 'officer_id', 'person_id', 'name', 'officer_role', 'etag', 'data'), rows, replace)
+
+    def put_filings(self, items: list, replace: bool = False) -> int:
+        # upserts (company number, filing history item) pairs
+        rows = [(
+            company_number,
+            item.get('transaction_id'),
+            item.get('category'),
+            item.get('type'),
+            item.get('date'),
+            json.dumps(item),
+        ) for company_number, item in items if item.get('transaction_id')]
+        return self.put_items('filings', ('company_number', 'transaction_id', 'category', 'type', 'date', 'data'), rows, replace)
+
+    def put_company_items(self, table: str, company_number: str, items: list) -> int:
+        # full list of PSCs, officers or filings of a company fetched from the API (possibly empty)
+        if not items:
+            with self.lock, self.connection:
+                self.connection.execute("DELETE FROM %s WHERE company_number = ?" % table, (company_number,))
+                self.mark_loaded(table, [company_number], time.time())
+            return 0
+        put = {'pscs': self.put_pscs, 'officers': self.put_officers, 'filings': self.put_filings}[table]
+        return put([(company_number, item) for item in items], replace=True)
+
+    def put_documents(self, company_number: str, documents: dict) -> int:
+        # upserts document metadata (document ID -> API data)
+        rows = [(document_id, company_number, data.get('etag'), json.dumps(data))
+                for document_id, data in documents.items() if isinstance(data, dict) and 'errors' not in data]
+        with self.lock, self.connection:
+            self.connection.executemany("""
+                INSERT INTO documents (document_id, company_number, etag, data) VALUES (?, ?, ?, ?)
+                ON CONFLICT (document_id) DO UPDATE SET
+                    company_number = excluded.company_number, etag = excluded.etag, data = excluded.data
+                WHERE excluded.etag IS NULL OR excluded.etag IS NOT documents.etag
+            """, rows)
+        return len(rows)
+
+    def put_analysis(self, company_number: str, analysis: str) -> None:
+        # aggregated data of an analysis (Company.to_json), replaces the output/<company number>/raw_data.json files
+        with self.lock, self.connection:
+            self.connection.execute("""
+                INSERT INTO companies (company_number, analysis, analysed_at) VALUES (?, ?, ?)
+                ON CONFLICT (company_number) DO UPDATE SET analysis = excluded.analysis, analysed_at = excluded.analysed_at
+            """, (company_number, analysis, time.time()))
+
+    def put_scores(self, company_number: str, summary_score: dict) -> None:
+        with self.lock, self.connection:
+            self.connection.execute("""
+                INSERT INTO companies (company_number, scores, final_score) VALUES (?, ?, ?)
+                ON CONFLICT (company_number) DO UPDATE SET scores = excluded.scores, final_score = excluded.final_score
+            """, (company_number, json.dumps(summary_score), summary_score.get('final_company_score')))
+
+    # Reads
+    def get_profile(self, company_number: str, fresh: bool = True) -> dict:
+        # stored company profile, or None if missing (or stale when fresh is set)
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT profile, updated_at FROM companies WHERE company_number = ?", (company_number,)).fetchone()
+        if row is None or row[0] is None or (fresh and not self.is_fresh(row[1])):
+            return None
+        return json.loads(row[0])
+
+    def get_items(self, table: str, company_number: str, fresh: bool = True) -> list:
+        # stored PSCs, officers or filings of a company (API item shape, in the order they were listed),
+        # or None if they haven't been loaded (recently when fresh is set)
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT %s_updated_at FROM companies WHERE company_number = ?" % table, (company_number,)).fetchone()
+            if row is None or row[0] is None or (fresh and not self.is_fresh(row[0])):
+                return None
+            rows = self.connection.execute(
+                "SELECT data FROM %s WHERE company_number = ? ORDER BY rowid" % table, (company_number,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get_pscs(self, company_number: str, fresh: bool = True) -> list:
+        return self.get_items('pscs', company_number, fresh)
+
+    def get_officers(self, company_number: str, fresh: bool = True) -> list:
+        return self.get_items('officers', company_number, fresh)
+
+    def get_filings(self, company_number: str, fresh: bool = True) -> list:
+        return self.get_items('filings', company_number, fresh)
+
+    def get_documents(self, company_number: str) -> dict:
+        # document ID -> stored document metadata
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT document_id, data FROM documents WHERE company_number = ?", (company_number,)).fetchall()
+        return {document_id: json.loads(data) for document_id, data in rows}
+
+    def get_analysis(self, company_number: str) -> dict:
+        # aggregated data of the last analysis of a company, or None
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT analysis FROM companies WHERE company_number = ?", (company_number,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    # Portfolio queries
+    def query(self, sql: str, parameters: tuple = ()) -> list:
+        with self.lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def companies_at(self, postal_code: str) -> list:
+        # company numbers registered at a postal code
+        return [row[0] for row in self.query(
+            "SELECT company_number FROM companies WHERE postal_code = ? ORDER BY company_number", (normalise_postal_code(postal_code),))]
+
+    def companies_with_sic_code(self, sic_code: str) -> list:
+        return [row[0] for row in self.query(
+            "SELECT company_number FROM sic_codes WHERE sic_code = ? ORDER BY company_number", (sic_code,))]
+
+    def appointments_of(self, person_id: str) -> list:
+        # (company number, officer role) of the stored appointments of an officer
+        return self.query(
+            "SELECT company_number, officer_role FROM officers WHERE person_id = ? ORDER BY company_number", (person_id,))
+
+    def analysed_companies(self, min_score: float = None) -> list:
+        # (company number, final score) of the companies analysed, highest scores first
+        return self.query("""
+            SELECT company_number, final_score FROM companies
+            WHERE analysed_at IS NOT NULL AND (? IS NULL OR final_score >= ?)
+            ORDER BY final_score DESC, company_number
+        """, (min_score, min_score))
+
+    def stats(self) -> dict:
+        with self.lock:
+            companies, bulk, analysed = self.connection.execute("""
+                SELECT COUNT(profile), COUNT(CASE WHEN source = 'bulk' THEN 1 END), COUNT(analysed_at) FROM companies
+            """).fetchone()
+            counts = {table: self.connection.execute("SELECT COUNT(*) FROM %s" % table).fetchone()[0]
+                      for table in ('pscs', 'officers', 'filings', 'documents')}
+        return dict({'companies': companies, 'bulk_companies': bulk, 'analysed': analysed}, **counts)
+
+    def close(self) -> None:
+        with self.open_lock:
+            if self.opened_connection is not None:
+                self.opened_connection.close()
+                self.opened_connection = None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load Companies House bulk snapshots into the local store")
+    parser.add_argument('kind', choices=['companies', 'pscs'], help="bulk company data CSV or PSC snapshot")
+    parser.add_argument('path', help="snapshot file (zipped as downloaded, or extracted)")
+    parser.add_argument('--store', default=os.getenv('COMPANY_STORE_PATH', 'output/companies.sqlite'))
+    args = parser.parse_args()
+
+    store = CompanyStore(args.store)
+    start = time.perf_counter()
+    if args.kind == 'companies':
+        count = store.ingest_companies_csv(args.path)
+    else:
+        count = store.ingest_pscs_jsonl(args.path)
+    elapsed = time.perf_counter() - start
+    print("Loaded %d %s in %.1fs (%.0f per second) - store: %s" % (
+        count, args.kind, elapsed, count / elapsed if elapsed > 0 else 0.0, store.stats()))
+    store.close()